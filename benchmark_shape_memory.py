@@ -0,0 +1,74 @@
+# benchmark_shape_memory.py
+"""Measure the memory used per annotation shape, for each shape type
+
+Usage: python benchmark_shape_memory.py [--count N]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from core.annotation import BoundingBox
+from core.polygon_shape import PolygonShape
+from core.circle_shape import CircleShape
+from core.ellipse_shape import EllipseShape
+
+IMAGE_SIZE = (1920, 1080)
+
+
+def make_box(i):
+    return BoundingBox(0.5, 0.5, 0.1, 0.2, class_id=i % 10, image_size=IMAGE_SIZE)
+
+
+def make_circle(i):
+    return CircleShape((0.5, 0.5), 0.05, class_id=i % 10, image_size=IMAGE_SIZE)
+
+
+def make_ellipse(i):
+    return EllipseShape((0.5, 0.5), 0.05, 0.08, class_id=i % 10, image_size=IMAGE_SIZE)
+
+
+def make_polygon(i):
+    polygon = PolygonShape([(0.1, 0.1), (0.3, 0.1), (0.3, 0.4), (0.1, 0.4)],
+                           class_id=i % 10, image_size=IMAGE_SIZE)
+    polygon.closed = True
+    return polygon
+
+
+FACTORIES = [
+    ('box', make_box),
+    ('circle', make_circle),
+    ('ellipse', make_ellipse),
+    ('polygon (4 vertices)', make_polygon),
+]
+
+
+def measure(factory, count):
+    """Get the traced bytes per shape for count shapes"""
+    gc.collect()
+    shapes = [None] * count  # Allocate the list up front so it is not counted per shape
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        shapes[i] = factory(i)
+    used = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    del shapes
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per annotation shape")
+    parser.add_argument('--count', type=int, default=1_000_000, help="Shapes to create per type")
+    args = parser.parse_args()
+
+    print(f"📏 Shape memory at {args.count:,} shapes per type")
+    print(f"{'Type':<22}{'Bytes/shape':>12}{'Total MB':>10}")
+    for name, factory in FACTORIES:
+        per_shape = measure(factory, args.count)
+        total_mb = per_shape * args.count / (1024 * 1024)
+        print(f"{name:<22}{per_shape:>12.1f}{total_mb:>10.1f}")
+    print("\n🎉 Benchmark complete!")
+
+
+if __name__ == '__main__':
+    main()
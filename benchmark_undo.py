@@ -0,0 +1,140 @@
+# benchmark_undo.py
+"""Compare full-list snapshot undo with command undo on a large annotation set
+
+Usage: python benchmark_undo.py [--count N] [--steps N]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from core.annotation import BoundingBox
+from core.polygon_shape import PolygonShape
+from core.history import History, ShapeList, AddShapes, RemoveShapes, MoveShapes, shape_size
+from core.version_history import VersionHistory
+
+IMAGE_SIZE = (1920, 1080)
+
+
+def make_shapes(count):
+    """Mostly boxes with some polygons, as in a typical dataset"""
+    shapes = []
+    for i in range(count):
+        x = (i % 100) / 100
+        y = (i // 100 % 100) / 100
+        if i % 10 == 0:
+            polygon = PolygonShape([(x, y), (x + 0.01, y), (x + 0.01, y + 0.01), (x, y + 0.01)],
+                                   class_id='car', image_size=IMAGE_SIZE)
+            polygon.closed = True
+            shapes.append(polygon)
+        else:
+            shapes.append(BoundingBox(x, y, 0.01, 0.01, class_id='car', image_size=IMAGE_SIZE))
+    return shapes
+
+
+class SnapshotHistory:
+    """The previous undo scheme: a copy of every shape per undo step"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def save(self, target):
+        self.undo_stack.append([shape.copy() for shape in target.shapes])
+        if len(self.undo_stack) > self.max_size:
+            self.undo_stack.pop(0)
+        self.redo_stack.clear()
+
+    def undo(self, target):
+        self.redo_stack.append([shape.copy() for shape in target.shapes])
+        target.shapes = self.undo_stack.pop()
+
+    def redo(self, target):
+        self.undo_stack.append([shape.copy() for shape in target.shapes])
+        target.shapes = self.redo_stack.pop()
+
+
+def edit_with_snapshots(history, target, step):
+    """Move one shape, saving a snapshot first"""
+    history.save(target)
+    target.shapes[step % len(target.shapes)].move(0.001, 0.001)
+
+
+def edit_with_commands(history, target, step):
+    """Move one shape, recording only what changed; also used for whole versions"""
+    moved = [target.shapes[step % len(target.shapes)]]
+    moved[0].move(0.001, 0.001)
+    history.push(MoveShapes(moved, 0.001, 0.001))
+
+
+def run(name, history, target, edit, steps):
+    """Time edits, undos and redos and measure the memory the history holds"""
+    gc.collect()
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for step in range(steps):
+        edit(history, target, step)
+    edit_ms = (time.perf_counter() - started) * 1000 / steps
+    held_mb = (tracemalloc.get_traced_memory()[0] - start_bytes) / (1024 * 1024)
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(steps):
+        history.undo(target)
+    undo_ms = (time.perf_counter() - started) * 1000 / steps
+
+    started = time.perf_counter()
+    for _ in range(steps):
+        history.redo(target)
+    redo_ms = (time.perf_counter() - started) * 1000 / steps
+    print(f"{name:<12}{edit_ms:>10.3f}{undo_ms:>10.3f}{redo_ms:>10.3f}{held_mb:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare snapshot and command undo")
+    parser.add_argument('--count', type=int, default=5000, help="Shapes on the image")
+    parser.add_argument('--steps', type=int, default=50, help="Edits to make, undo and redo")
+    args = parser.parse_args()
+
+    print(f"📏 Undo of single-shape moves at {args.count:,} shapes, {args.steps} steps")
+    print(f"{'History':<12}{'Edit ms':>10}{'Undo ms':>10}{'Redo ms':>10}{'Held MB':>11}")
+
+    run('snapshots', SnapshotHistory(args.steps), ShapeList(make_shapes(args.count)),
+        edit_with_snapshots, args.steps)
+    run('commands', History(max_size=args.steps), ShapeList(make_shapes(args.count)),
+        edit_with_commands, args.steps)
+    target = ShapeList(make_shapes(args.count))
+    run('versions', VersionHistory(args.steps, target.shapes), target, edit_with_commands, args.steps)
+
+    # Add and delete copy no shapes either; only the list filter visits them all
+    target = ShapeList(make_shapes(args.count))
+    history = History(max_size=args.steps)
+    started = time.perf_counter()
+    added = make_shapes(10)
+    target.add_shapes(added)
+    history.push(AddShapes(added))
+    removed = target.shapes[:10]
+    command = RemoveShapes(removed, target.shapes)
+    target.remove_shapes(removed)
+    history.push(command)
+    history.undo(target)
+    history.undo(target)
+    print(f"\nAdd + delete 10 shapes, both undone: {(time.perf_counter() - started) * 1000:.3f} ms")
+
+    # The history budget must see the vertex data of the polygons it holds
+    sizes = {}
+    for count in (4, 5000):
+        polygon = PolygonShape([(i / count, (i % 2) / 2) for i in range(count)], image_size=IMAGE_SIZE)
+        sizes[count] = shape_size(polygon)
+        print(f"Polygon of {count:,} vertices counts as {sizes[count]:,} bytes")
+    if sizes[5000] - sizes[4] >= (5000 - 4) * 16:
+        print("✅ Polygon size grows with its vertex count")
+    else:
+        print("❌ Polygon vertex data is not counted")
+    print("\n🎉 Benchmark complete!")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,4 +3,9 @@ from .class_manager import ClassManager, ClassCategory
 from .annotation import BoundingBox
 from .polygon_shape import PolygonShape
 from .circle_shape import CircleShape
-from .ellipse_shape import EllipseShape
\ No newline at end of file
+from .ellipse_shape import EllipseShape
+from .hit_test import ShapeHitTester
+from .id_allocator import IdAllocator, new_shape_id, new_shape_ids
+from .shape_registry import ShapeType, register_shape_type, get_shape_type, shape_from_dict
+from .history import History, ImageHistories, Command, CommandGroup, AddShapes, RemoveShapes, MoveShapes, MoveVertex, ResizeShape, ChangeClass
+from .version_history import VersionHistory
@@ -1,12 +1,19 @@
 # core/annotation.py
-import uuid  # Added this import
 import math
+from .id_allocator import new_shape_id, observe_shape_id
 
 class BoundingBox:
     """Represents a YOLO-style bounding box annotation"""
     
+    # Slots instead of a per-instance __dict__ keep large datasets compact
+    __slots__ = ('id', 'class_id', 'x', 'y', 'width', 'height', 'image_width', 'image_height',
+                 'selected', '_resize_origin', '_pixel_cache')
+    
+    type = 'box'
+    created_at = None  # Never set per box, kept for compatibility
+    
     def __init__(self, x=0, y=0, width=0, height=0, class_id=None, image_size=(1, 1)):
-        self.id = str(uuid.uuid4())[:8]
+        self.id = new_shape_id()
         self.class_id = class_id
         self.x = x  # Center x (normalized)
         self.y = y  # Center y (normalized)
@@ -14,21 +21,23 @@ class BoundingBox:
         self.height = height  # Height (normalized)
         self.image_width, self.image_height = image_size
         self.selected = False
-        self.created_at = None
-        self.type = 'box'
         self._resize_origin = None  # Add this line
+        self._pixel_cache = None  # Pixel rect, rebuilt after coordinate changes
+        
+    def invalidate_geometry(self):
+        """Drop cached pixel geometry after the coordinates changed"""
+        self._pixel_cache = None
         
     def copy(self):
         """Create a copy of this bounding box"""
-        new_box = BoundingBox(
+        new_box = self.__class__(
             x=self.x,
             y=self.y,
             width=self.width,
             height=self.height,
             class_id=self.class_id,
             image_size=(self.image_width, self.image_height)
-        )
-        new_box.id = str(uuid.uuid4())[:8]
+        )  # Gets a new id
         return new_box
         
     def from_pixels(self, x1, y1, x2, y2, image_width, image_height):
@@ -46,9 +55,13 @@ class BoundingBox:
         self.y = center_y / image_height
         self.width = box_width / image_width
         self.height = box_height / image_height
+        self.invalidate_geometry()
         
     def to_pixels(self):
         """Convert normalized coordinates to pixel coordinates"""
+        if self._pixel_cache is not None:
+            return self._pixel_cache
+        
         center_x = self.x * self.image_width
         center_y = self.y * self.image_height
         box_width = self.width * self.image_width
@@ -59,13 +72,24 @@ class BoundingBox:
         x2 = int(center_x + box_width / 2)
         y2 = int(center_y + box_height / 2)
         
-        return x1, y1, x2, y2
+        self._pixel_cache = (x1, y1, x2, y2)
+        return self._pixel_cache
+    
+    def get_bounds(self):
+        """Get the pixel bounding rect (x1, y1, x2, y2)"""
+        return self.to_pixels()
     
     def contains_point(self, px, py):
         """Check if point is inside the box (pixel coordinates)"""
         x1, y1, x2, y2 = self.to_pixels()
         return x1 <= px <= x2 and y1 <= py <= y2
     
+    def move(self, dx, dy):
+        """Move the box by delta (normalized)"""
+        self.x += dx
+        self.y += dy
+        self.invalidate_geometry()
+
     def get_resize_handles(self):
         """Get the positions of resize handles (corners)"""
         x1, y1, x2, y2 = self.to_pixels()
@@ -150,6 +174,7 @@ class BoundingBox:
         self.y = new_center_y / self.image_height
         self.width = new_width / self.image_width
         self.height = new_height / self.image_height
+        self.invalidate_geometry()
         
         print(f"✅ Final normalized: x={self.x:.3f}, y={self.y:.3f}, w={self.width:.3f}, h={self.height:.3f}")
         
@@ -183,4 +208,5 @@ class BoundingBox:
             image_size=image_size
         )
         box.id = data['id']
+        observe_shape_id(box.id)
         return box
\ No newline at end of file
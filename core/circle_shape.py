@@ -1,14 +1,17 @@
 # core/circle_shape.py
-import uuid
 import math
 from .shape_base import Shape
+from .id_allocator import observe_shape_id
 
 class CircleShape(Shape):
     """Circle shape for segmentation"""
     
+    __slots__ = ('center_x', 'center_y', 'radius', '_resize_origin')
+    
+    type = 'circle'
+    
     def __init__(self, center=(0, 0), radius=0, class_id=None, image_size=(1, 1)):
         super().__init__(class_id, image_size)
-        self.type = 'circle'
         self.center_x, self.center_y = center  # Normalized coordinates
         self.radius = radius  # Normalized radius
         self._resize_origin = None  # Store original state for resizing
@@ -18,13 +21,23 @@ class CircleShape(Shape):
         self.center_x = center_x / self.image_width
         self.center_y = center_y / self.image_height
         self.radius = radius / max(self.image_width, self.image_height)
+        self.invalidate_geometry()
         
     def to_pixels(self):
         """Convert to pixel coordinates"""
-        cx = int(self.center_x * self.image_width)
-        cy = int(self.center_y * self.image_height)
-        r = int(self.radius * max(self.image_width, self.image_height))
-        return cx, cy, r
+        if self._pixel_cache is None:
+            cx = int(self.center_x * self.image_width)
+            cy = int(self.center_y * self.image_height)
+            r = int(self.radius * max(self.image_width, self.image_height))
+            self._pixel_cache = (cx, cy, r)
+        return self._pixel_cache
+    
+    def get_bounds(self):
+        """Get the pixel bounding rect (x1, y1, x2, y2)"""
+        if self._bounds_cache is None:
+            cx, cy, r = self.to_pixels()
+            self._bounds_cache = (cx - r, cy - r, cx + r, cy + r)
+        return self._bounds_cache
     
     def contains_point(self, x, y):
         """Check if point is inside the circle"""
@@ -36,6 +49,7 @@ class CircleShape(Shape):
         """Move the circle by delta (normalized)"""
         self.center_x += dx
         self.center_y += dy
+        self.invalidate_geometry()
         
     def get_resize_handles(self):
         """Get resize handles - only corner handles for simplicity"""
@@ -94,6 +108,7 @@ class CircleShape(Shape):
         self.center_x = new_cx / self.image_width
         self.center_y = new_cy / self.image_height
         self.radius = new_r / max(self.image_width, self.image_height)
+        self.invalidate_geometry()
 
         return True
     
@@ -123,4 +138,5 @@ class CircleShape(Shape):
             image_size=image_size
         )
         circle.id = data['id']
+        observe_shape_id(circle.id)
         return circle
\ No newline at end of file
@@ -1,14 +1,17 @@
 # core/ellipse_shape.py
-import uuid
 import math
 from .shape_base import Shape
+from .id_allocator import observe_shape_id
 
 class EllipseShape(Shape):
     """Ellipse shape for segmentation"""
     
+    __slots__ = ('center_x', 'center_y', 'radius_x', 'radius_y', '_resize_origin')
+    
+    type = 'ellipse'
+    
     def __init__(self, center=(0, 0), radius_x=0, radius_y=0, class_id=None, image_size=(1, 1)):
         super().__init__(class_id, image_size)
-        self.type = 'ellipse'
         self.center_x, self.center_y = center  # Normalized coordinates
         self.radius_x = radius_x  # Normalized horizontal radius
         self.radius_y = radius_y  # Normalized vertical radius
@@ -20,14 +23,24 @@ class EllipseShape(Shape):
         self.center_y = center_y / self.image_height
         self.radius_x = radius_x / self.image_width
         self.radius_y = radius_y / self.image_height
+        self.invalidate_geometry()
         
     def to_pixels(self):
         """Convert to pixel coordinates"""
-        cx = int(self.center_x * self.image_width)
-        cy = int(self.center_y * self.image_height)
-        rx = int(self.radius_x * self.image_width)
-        ry = int(self.radius_y * self.image_height)
-        return cx, cy, rx, ry
+        if self._pixel_cache is None:
+            cx = int(self.center_x * self.image_width)
+            cy = int(self.center_y * self.image_height)
+            rx = int(self.radius_x * self.image_width)
+            ry = int(self.radius_y * self.image_height)
+            self._pixel_cache = (cx, cy, rx, ry)
+        return self._pixel_cache
+    
+    def get_bounds(self):
+        """Get the pixel bounding rect (x1, y1, x2, y2)"""
+        if self._bounds_cache is None:
+            cx, cy, rx, ry = self.to_pixels()
+            self._bounds_cache = (cx - rx, cy - ry, cx + rx, cy + ry)
+        return self._bounds_cache
     
     def contains_point(self, x, y):
         """Check if point is inside the ellipse using ellipse equation"""
@@ -42,6 +55,7 @@ class EllipseShape(Shape):
         """Move the ellipse by delta (normalized)"""
         self.center_x += dx
         self.center_y += dy
+        self.invalidate_geometry()
         
     def get_resize_handles(self):
         """Get resize handles - simple corner handles"""
@@ -103,6 +117,7 @@ class EllipseShape(Shape):
         self.center_y = new_cy / self.image_height
         self.radius_x = new_rx / self.image_width
         self.radius_y = new_ry / self.image_height
+        self.invalidate_geometry()
 
         return True
     
@@ -133,4 +148,5 @@ class EllipseShape(Shape):
             image_size=image_size
         )
         ellipse.id = data['id']
+        observe_shape_id(ellipse.id)
         return ellipse
\ No newline at end of file
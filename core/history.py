@@ -0,0 +1,439 @@
+# core/history.py
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from .shape_base import slot_names
+from .shape_registry import get_shape_type
+
+# Default memory budget shared by the undo histories of all images
+DEFAULT_HISTORY_BUDGET = 64 * 1024 * 1024
+
+
+def estimate_size(value):
+    """Rough deep size in bytes of saved values; shapes and other objects count as references only"""
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (int, float, str, bytes)):
+        return sys.getsizeof(value)
+    if hasattr(value, 'nbytes'):
+        # getsizeof of an array view is only its header; count the data it sees too
+        if getattr(value, 'base', None) is not None:
+            return sys.getsizeof(value) + value.nbytes
+        return sys.getsizeof(value)
+    return 0
+
+
+def shape_size(shape):
+    """Rough size in bytes of a shape and everything it holds"""
+    return sys.getsizeof(shape) + sum(
+        estimate_size(getattr(shape, name, None)) for name in slot_names(type(shape))
+    )
+
+
+class Command(ABC):
+    """An undoable edit that keeps only what it changed
+
+    apply() redoes the edit and revert() undoes it on a target holding the
+    shapes. A target provides add_shapes(shapes), remove_shapes(shapes),
+    insert_shapes([(index, shape), ...]) and shape_geometry_changed(shape).
+    """
+
+    _size = None  # Cached size_bytes()
+
+    @abstractmethod
+    def apply(self, target):
+        """Make the edit on the target"""
+        pass
+
+    @abstractmethod
+    def revert(self, target):
+        """Undo the edit on the target"""
+        pass
+
+    def merge(self, other):
+        """Fold a later command into this one if it continues the same edit; returns True if merged"""
+        return False
+
+    def size_bytes(self):
+        """Rough memory held by this command, not counting shapes still on the image"""
+        if self._size is None:
+            self._size = sys.getsizeof(self) + sum(estimate_size(value) for value in vars(self).values())
+        return self._size
+
+
+class AddShapes(Command):
+    """Shapes added on top of the others"""
+
+    def __init__(self, shapes):
+        self.shapes = list(shapes)
+
+    def apply(self, target):
+        target.add_shapes(self.shapes)
+
+    def revert(self, target):
+        target.remove_shapes(self.shapes)
+
+
+class RemoveShapes(Command):
+    """Shapes removed, remembering where they were in the z-order"""
+
+    def __init__(self, shapes, all_shapes):
+        removed = {id(shape) for shape in shapes}
+        self.entries = [(index, shape) for index, shape in enumerate(all_shapes) if id(shape) in removed]
+
+    def apply(self, target):
+        target.remove_shapes([shape for _, shape in self.entries])
+
+    def revert(self, target):
+        target.insert_shapes(self.entries)
+
+    def size_bytes(self):
+        # Removed shapes live on only in the history
+        if self._size is None:
+            self._size = super().size_bytes() + sum(shape_size(shape) for _, shape in self.entries)
+        return self._size
+
+
+def same_shapes(a, b):
+    """Check that two lists hold the very same shapes, in order"""
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+class MoveShapes(Command):
+    """Shapes moved together, as the normalized delta they moved by"""
+
+    def __init__(self, shapes, dx, dy):
+        self.shapes = list(shapes)
+        self.dx = dx
+        self.dy = dy
+
+    def _move(self, target, dx, dy):
+        for shape in self.shapes:
+            shape.move(dx, dy)
+            target.shape_geometry_changed(shape)
+
+    def apply(self, target):
+        self._move(target, self.dx, self.dy)
+
+    def revert(self, target):
+        self._move(target, -self.dx, -self.dy)
+
+    def merge(self, other):
+        if type(other) is not type(self) or not same_shapes(self.shapes, other.shapes):
+            return False
+        self.dx += other.dx
+        self.dy += other.dy
+        return True
+
+
+class MoveVertex(Command):
+    """One polygon vertex dragged, as its normalized position before and after"""
+
+    def __init__(self, shape, index, before, after):
+        self.shapes = [shape]
+        self.index = index
+        self.before = before
+        self.after = after
+
+    def _set(self, target, point):
+        shape = self.shapes[0]
+        shape.points[self.index] = point
+        shape.invalidate_geometry()
+        target.shape_geometry_changed(shape)
+
+    def apply(self, target):
+        self._set(target, self.after)
+
+    def revert(self, target):
+        self._set(target, self.before)
+
+    def merge(self, other):
+        if type(other) is not type(self) or self.shapes[0] is not other.shapes[0] or self.index != other.index:
+            return False
+        self.after = other.after
+        return True
+
+
+class ResizeShape(Command):
+    """One shape resized, as its whole geometry before and after"""
+
+    def __init__(self, shape, before, after):
+        self.shapes = [shape]
+        self.before = before
+        self.after = after
+
+    def _set(self, target, geometry):
+        shape = self.shapes[0]
+        get_shape_type(shape).set_geometry(shape, geometry)
+        target.shape_geometry_changed(shape)
+
+    def apply(self, target):
+        self._set(target, self.after)
+
+    def revert(self, target):
+        self._set(target, self.before)
+
+    def merge(self, other):
+        if type(other) is not type(self) or self.shapes[0] is not other.shapes[0]:
+            return False
+        self.after = other.after
+        self._size = None
+        return True
+
+
+class ChangeClass(Command):
+    """Shapes given another class"""
+
+    def __init__(self, shapes, class_id):
+        self.shapes = list(shapes)
+        self.old_class_ids = [shape.class_id for shape in self.shapes]
+        self.class_id = class_id
+
+    def apply(self, target):
+        for shape in self.shapes:
+            shape.class_id = self.class_id
+            target.shape_geometry_changed(shape)  # The label, and so the shape's area, changes
+
+    def revert(self, target):
+        for shape, class_id in zip(self.shapes, self.old_class_ids):
+            shape.class_id = class_id
+            target.shape_geometry_changed(shape)
+
+    def merge(self, other):
+        if type(other) is not type(self) or not same_shapes(self.shapes, other.shapes):
+            return False
+        self.class_id = other.class_id
+        return True
+
+
+class CommandGroup(Command):
+    """Several commands undone and redone as one step"""
+
+    def __init__(self, commands):
+        self.commands = list(commands)
+
+    def apply(self, target):
+        for command in self.commands:
+            command.apply(target)
+
+    def revert(self, target):
+        for command in reversed(self.commands):
+            command.revert(target)
+
+    def size_bytes(self):
+        if self._size is None:
+            self._size = sys.getsizeof(self) + sys.getsizeof(self.commands) + \
+                sum(command.size_bytes() for command in self.commands)
+        return self._size
+
+
+class History:
+    """Undo and redo stacks of commands, keeping at most max_size undo steps
+
+    Commands pushed between begin_group() and end_group() become one step.
+    A command pushed with coalesce=True is merged into the previous step
+    when that one was also coalescing, was pushed less than merge_window
+    seconds earlier and continues the same edit, e.g. repeated nudges.
+    """
+
+    merge_window = 1.0  # Seconds
+
+    def __init__(self, max_size=50):
+        self.max_size = max_size
+        self.undo_stack = []
+        self.redo_stack = []
+        self._group = None  # Commands of the open group
+        self._group_depth = 0
+        self._last_push = None  # Time of the last coalescing push, or None
+
+    @property
+    def undo_count(self):
+        return len(self.undo_stack)
+
+    @property
+    def redo_count(self):
+        return len(self.redo_stack)
+
+    @property
+    def size_bytes(self):
+        """Rough memory held by all commands"""
+        return sum(command.size_bytes() for command in self.undo_stack) + \
+            sum(command.size_bytes() for command in self.redo_stack)
+
+    def begin_group(self):
+        """Collect the commands pushed from now on into one undo step; groups nest"""
+        if self._group_depth == 0:
+            self._group = []
+        self._group_depth += 1
+
+    def end_group(self):
+        """Close a group, pushing its commands as one undo step"""
+        if self._group_depth == 0:
+            return
+        self._group_depth -= 1
+        if self._group_depth:
+            return
+        commands, self._group = self._group, None
+        if commands:
+            self.push(commands[0] if len(commands) == 1 else CommandGroup(commands))
+
+    def push(self, command, coalesce=False):
+        """Record a command that has just been applied"""
+        if self._group is not None:
+            if not (coalesce and self._group and self._group[-1].merge(command)):
+                self._group.append(command)
+            return
+
+        now = time.monotonic()
+        last_push, self._last_push = self._last_push, now if coalesce else None
+        if (coalesce and last_push is not None and now - last_push <= self.merge_window
+                and self.undo_stack and not self.redo_stack and self.undo_stack[-1].merge(command)):
+            return
+
+        self.undo_stack.append(command)
+        if len(self.undo_stack) > self.max_size:
+            self.undo_stack.pop(0)
+        self.redo_stack.clear()  # A new edit ends the redo chain
+
+    def discard(self, command):
+        """Forget a command without reverting it, if it is still the last undo step
+
+        Returns True if it was dropped. Later steps may depend on what the
+        command did, so it is kept otherwise.
+        """
+        if self._group is not None or not self.undo_stack or self.undo_stack[-1] is not command:
+            return False
+        self.undo_stack.pop()
+        self._last_push = None
+        return True
+
+    def undo(self, target):
+        """Revert the last command, returning it, or None when there is nothing to undo"""
+        self._last_push = None
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        command.revert(target)
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self, target):
+        """Apply the last undone command again, returning it, or None"""
+        self._last_push = None
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        command.apply(target)
+        self.undo_stack.append(command)
+        return command
+
+    def evict_oldest(self):
+        """Drop the oldest undo step, or the furthest redo step when there is none
+
+        Returns the bytes freed, or None when the history is empty.
+        """
+        if self.undo_stack:
+            return self.undo_stack.pop(0).size_bytes()
+        if self.redo_stack:
+            return self.redo_stack.pop(0).size_bytes()
+        return None
+
+    def clear(self, shapes=()):
+        """Drop all commands; commands need no starting shapes, so shapes is unused"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._group = None
+        self._group_depth = 0
+        self._last_push = None
+
+
+class ImageHistories:
+    """Undo histories of several images, sharing one memory budget
+
+    Histories are kept per image path, least recently visited first. Past
+    the budget, the oldest steps of the least recently visited images are
+    dropped first, so the image being edited keeps its history longest.
+    The shapes of images not being edited are stashed here too. They are
+    annotations, not history, so they are never dropped and are measured
+    apart from the budget, which covers history steps only.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_HISTORY_BUDGET, max_size=50, history_class=History):
+        self.budget_bytes = budget_bytes
+        self.max_size = max_size
+        self.history_class = history_class
+        self.histories = OrderedDict()  # Image path -> history
+        self.stashed = {}  # Image path -> (shapes, rough bytes) of images left for another
+
+    def visit(self, image_path, shapes=()):
+        """Get the history of an image, making it the most recently visited
+
+        A new history starts from the image's current shapes.
+        """
+        history = self.histories.get(image_path)
+        if history is None:
+            history = self.history_class(max_size=self.max_size)
+            history.clear(shapes)
+            self.histories[image_path] = history
+        self.histories.move_to_end(image_path)
+        return history
+
+    def stash(self, image_path, shapes):
+        """Keep the shapes of an image being left, until it is visited again"""
+        self.stashed[image_path] = (shapes, sum(shape_size(shape) for shape in shapes))
+
+    def unstash(self, image_path):
+        """Take back the stashed shapes of an image, or an empty list"""
+        return self.stashed.pop(image_path, ([], 0))[0]
+
+    @property
+    def size_bytes(self):
+        """Rough memory held by all histories"""
+        return sum(history.size_bytes for history in self.histories.values())
+
+    @property
+    def stashed_bytes(self):
+        """Rough memory held by the stashed shapes of images not being edited"""
+        return sum(size for _, size in self.stashed.values())
+
+    def enforce_budget(self):
+        """Evict steps until the histories fit the budget, returning the bytes they hold"""
+        total = self.size_bytes
+        for history in self.histories.values():
+            while total > self.budget_bytes:
+                freed = history.evict_oldest()
+                if freed is None:
+                    break
+                total -= freed
+            if total <= self.budget_bytes:
+                break
+        return total
+
+    def clear(self):
+        """Drop every image's history; stashed shapes are kept"""
+        self.histories.clear()
+
+
+class ShapeList:
+    """Minimal command target over a plain list of shapes, without a GUI"""
+
+    def __init__(self, shapes=None):
+        self.shapes = list(shapes or [])
+
+    def add_shapes(self, shapes):
+        self.shapes.extend(shapes)
+
+    def remove_shapes(self, shapes):
+        removed = {id(shape) for shape in shapes}
+        self.shapes = [shape for shape in self.shapes if id(shape) not in removed]
+
+    def insert_shapes(self, entries):
+        for index, shape in sorted(entries, key=lambda entry: entry[0]):
+            self.shapes.insert(index, shape)
+
+    def shape_geometry_changed(self, shape):
+        pass
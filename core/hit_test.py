@@ -0,0 +1,208 @@
+# core/hit_test.py
+import numpy as np
+
+# Upper bound on elements in one (points x shapes) intermediate array
+CHUNK_ELEMENTS = 4 * 1024 * 1024
+
+
+class ShapeHitTester:
+    """Vectorized point-in-shape tests over a fixed list of shapes
+
+    The parameters of all boxes, circles, ellipses and closed polygons are
+    packed into NumPy arrays once, so each query tests every shape without a
+    Python-level loop. Results match the shapes' own contains_point, including
+    the integer pixel rounding done by to_pixels. Rebuild the tester after the
+    shapes change.
+    """
+
+    def __init__(self, shapes):
+        self.shapes = list(shapes)
+
+        boxes, circles, ellipses, polygons, others = [], [], [], [], []
+        for index, shape in enumerate(self.shapes):
+            shape_type = getattr(shape, 'type', 'box')
+            if shape_type == 'box':
+                boxes.append(index)
+            elif shape_type == 'circle':
+                circles.append(index)
+            elif shape_type == 'ellipse':
+                ellipses.append(index)
+            elif shape_type == 'polygon':
+                # Open polygons never contain a point
+                if shape.closed and len(shape.points) >= 3:
+                    polygons.append(index)
+            else:
+                others.append(index)
+
+        self._init_boxes(boxes, [
+            (s.x, s.y, s.width, s.height, s.image_width, s.image_height)
+            for s in (self.shapes[i] for i in boxes)
+        ])
+        self._init_circles(circles, [
+            (s.center_x, s.center_y, s.radius, s.image_width, s.image_height)
+            for s in (self.shapes[i] for i in circles)
+        ])
+        self._init_ellipses(ellipses, [
+            (s.center_x, s.center_y, s.radius_x, s.radius_y, s.image_width, s.image_height)
+            for s in (self.shapes[i] for i in ellipses)
+        ])
+        pixel_points = [self.shapes[i].to_pixel_points() for i in polygons]
+        self._init_polygons(
+            polygons,
+            [point for points in pixel_points for point in points],
+            [len(points) for points in pixel_points]
+        )
+        self.other_indices = others  # Unknown shape types use their own contains_point
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def _init_boxes(self, indices, params):
+        """Pack box pixel rects from (x, y, width, height, image width, image height) rows"""
+        self.box_indices = np.array(indices, dtype=np.intp)
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 6)
+        x, y, w, h, iw, ih = params.T
+
+        # Same arithmetic as BoundingBox.to_pixels, int() truncates toward zero
+        center_x, center_y = x * iw, y * ih
+        box_width, box_height = w * iw, h * ih
+        self.box_x1 = np.trunc(center_x - box_width / 2)
+        self.box_y1 = np.trunc(center_y - box_height / 2)
+        self.box_x2 = np.trunc(center_x + box_width / 2)
+        self.box_y2 = np.trunc(center_y + box_height / 2)
+
+    def _init_circles(self, indices, params):
+        """Pack circle pixel centers and radii from (cx, cy, radius, image width, image height) rows"""
+        self.circle_indices = np.array(indices, dtype=np.intp)
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 5)
+        cx, cy, r, iw, ih = params.T
+        self.circle_cx = np.trunc(cx * iw)
+        self.circle_cy = np.trunc(cy * ih)
+        self.circle_r = np.trunc(r * np.maximum(iw, ih))
+
+    def _init_ellipses(self, indices, params):
+        """Pack ellipse pixel centers and radii from (cx, cy, rx, ry, image width, image height) rows"""
+        params = np.asarray(params, dtype=np.float64).reshape(-1, 6)
+        cx, cy, rx, ry, iw, ih = params.T
+        rx, ry = np.trunc(rx * iw), np.trunc(ry * ih)
+
+        # Degenerate ellipses never contain a point
+        valid = (rx != 0) & (ry != 0)
+        self.ellipse_indices = np.array(indices, dtype=np.intp)[valid]
+        self.ellipse_cx = np.trunc(cx * iw)[valid]
+        self.ellipse_cy = np.trunc(cy * ih)[valid]
+        self.ellipse_rx = rx[valid]
+        self.ellipse_ry = ry[valid]
+
+    def _init_polygons(self, indices, pixel_points, counts):
+        """Pack the edges of all polygons into flat arrays
+
+        pixel_points holds every polygon's pixel vertices back to back and
+        counts the number of vertices of each polygon.
+        """
+        self.polygon_indices = np.array(indices, dtype=np.intp)
+        points = np.asarray(pixel_points, dtype=np.float64).reshape(-1, 2)
+        counts = np.asarray(counts, dtype=np.intp)
+        starts = np.zeros(len(counts), dtype=np.intp)
+        np.cumsum(counts[:-1], out=starts[1:])
+
+        # Each vertex joins the next one, and the last vertex of a polygon its first
+        following = np.arange(1, len(points) + 1, dtype=np.intp)
+        if len(counts):
+            following[starts + counts - 1] = starts
+
+        self.polygon_starts = starts
+        self.edge_x1 = np.ascontiguousarray(points[:, 0])
+        self.edge_y1 = np.ascontiguousarray(points[:, 1])
+        self.edge_x2 = points[following, 0]
+        self.edge_y2 = points[following, 1]
+        self.edge_min_y = np.minimum(self.edge_y1, self.edge_y2)
+        self.edge_max_y = np.maximum(self.edge_y1, self.edge_y2)
+        self.edge_max_x = np.maximum(self.edge_x1, self.edge_x2)
+        self.edge_vertical = self.edge_x1 == self.edge_x2
+
+        # Horizontal edges are never crossed, so any divisor works for them
+        dy = self.edge_y2 - self.edge_y1
+        self.edge_dy = np.where(dy == 0, 1.0, dy)
+
+    def _chunk_size(self):
+        """Get how many points to test at once to bound temporary memory"""
+        width = max(len(self.shapes), len(self.edge_x1), 1)
+        return max(1, CHUNK_ELEMENTS // width)
+
+    def _mask(self, xs, ys):
+        """Test a chunk of points against all shapes, giving a (points, shapes) bool array"""
+        xs = xs[:, None]
+        ys = ys[:, None]
+        mask = np.zeros((len(xs), len(self.shapes)), dtype=bool)
+
+        if len(self.box_indices):
+            mask[:, self.box_indices] = (
+                (self.box_x1 <= xs) & (xs <= self.box_x2) &
+                (self.box_y1 <= ys) & (ys <= self.box_y2)
+            )
+
+        if len(self.circle_indices):
+            distance = np.sqrt((xs - self.circle_cx) ** 2 + (ys - self.circle_cy) ** 2)
+            mask[:, self.circle_indices] = distance <= self.circle_r
+
+        if len(self.ellipse_indices):
+            normalized_x = ((xs - self.ellipse_cx) / self.ellipse_rx) ** 2
+            normalized_y = ((ys - self.ellipse_cy) / self.ellipse_ry) ** 2
+            mask[:, self.ellipse_indices] = (normalized_x + normalized_y) <= 1
+
+        if len(self.polygon_indices):
+            # Ray casting: count edge crossings of a ray to the right of each point
+            crosses = (ys > self.edge_min_y) & (ys <= self.edge_max_y) & (xs <= self.edge_max_x)
+            x_inters = (ys - self.edge_y1) * (self.edge_x2 - self.edge_x1) / self.edge_dy + self.edge_x1
+            crosses &= self.edge_vertical | (xs <= x_inters)
+            mask[:, self.polygon_indices] = np.bitwise_xor.reduceat(crosses, self.polygon_starts, axis=1)
+
+        for index in self.other_indices:
+            shape = self.shapes[index]
+            mask[:, index] = [shape.contains_point(x, y) for x, y in zip(xs[:, 0], ys[:, 0])]
+
+        return mask
+
+    def contains(self, x, y):
+        """Get a bool array telling which shapes contain a pixel point"""
+        return self._mask(np.array([x], dtype=np.float64), np.array([y], dtype=np.float64))[0]
+
+    def hits(self, x, y):
+        """Get all shapes containing a pixel point, bottom to top"""
+        return [self.shapes[i] for i in np.flatnonzero(self.contains(x, y))]
+
+    def topmost(self, x, y):
+        """Get the last (topmost) shape containing a pixel point, or None"""
+        hit = np.flatnonzero(self.contains(x, y))
+        return self.shapes[hit[-1]] if len(hit) else None
+
+    def contains_points(self, points):
+        """Test many pixel points, giving a (points, shapes) bool array"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.zeros((len(points), len(self.shapes)), dtype=bool)
+        step = self._chunk_size()
+        for start in range(0, len(points), step):
+            chunk = points[start:start + step]
+            result[start:start + step] = self._mask(chunk[:, 0], chunk[:, 1])
+        return result
+
+    def topmost_indices(self, points):
+        """Get the index of the topmost shape containing each pixel point, or -1
+
+        Uses memory proportional to the chunk size only, so it suits testing
+        millions of points.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.full(len(points), -1, dtype=np.intp)
+        if not self.shapes:
+            return result
+
+        step = self._chunk_size()
+        last = len(self.shapes) - 1
+        for start in range(0, len(points), step):
+            chunk = points[start:start + step]
+            mask = self._mask(chunk[:, 0], chunk[:, 1])
+            top = last - np.argmax(mask[:, ::-1], axis=1)
+            result[start:start + step] = np.where(mask.any(axis=1), top, -1)
+        return result
@@ -0,0 +1,60 @@
+# core/id_allocator.py
+import itertools
+import secrets
+
+
+class IdAllocator:
+    """Hands out unique shape ids made of a session prefix and a counter
+
+    Ids look like "3fa2c1d0-1a": eight random hex digits picked once per
+    allocator, a dash, then a hex counter. Legacy ids (eight hex digits with
+    no dash) can never clash with them, and observe() moves the counter past
+    ids loaded from disk that happen to share the prefix.
+    """
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix or secrets.token_hex(4)
+        self._lead = self.prefix + '-'
+        self._counter = itertools.count(1)
+
+    def next_id(self):
+        """Get a new unique id"""
+        return f"{self._lead}{next(self._counter):x}"
+
+    def next_ids(self, count):
+        """Get count new unique ids, for bulk imports"""
+        lead = self._lead
+        counter = self._counter
+        return [f"{lead}{next(counter):x}" for _ in range(count)]
+
+    def observe(self, shape_id):
+        """Make sure an id that already exists is never handed out again"""
+        if not isinstance(shape_id, str) or not shape_id.startswith(self._lead):
+            return
+        try:
+            used = int(shape_id[len(self._lead):], 16)
+        except ValueError:
+            return
+
+        # Restart the counter past the observed id, never going backwards
+        next_free = max(next(self._counter), used + 1)
+        self._counter = itertools.count(next_free)
+
+
+# Shared by every shape created in this session
+_allocator = IdAllocator()
+
+
+def new_shape_id():
+    """Get a new unique shape id"""
+    return _allocator.next_id()
+
+
+def new_shape_ids(count):
+    """Get count new unique shape ids"""
+    return _allocator.next_ids(count)
+
+
+def observe_shape_id(shape_id):
+    """Register a shape id loaded from disk so it is never reused"""
+    _allocator.observe(shape_id)
@@ -1,40 +1,145 @@
 # core/polygon_shape.py
-import uuid
 import math
+import numpy as np
 from .shape_base import Shape
+from .id_allocator import observe_shape_id
+from .spatial_index import PointGrid
+
+def simplify_points(points, tolerance):
+    """Simplify a closed outline with the Douglas-Peucker algorithm"""
+    n = len(points)
+    if n <= 3 or tolerance <= 0:
+        return list(points)
+    
+    # Treat the ring as a polyline that returns to its first point
+    ring = list(points) + [points[0]]
+    keep = [False] * len(ring)
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = ring[first]
+        bx, by = ring[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        
+        max_dist_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = ring[i]
+            if length_sq == 0:
+                dist_sq = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                cross = (px - ax) * dy - (py - ay) * dx
+                dist_sq = cross * cross / length_sq
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+        
+        if max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    
+    simplified = [point for point, kept in zip(ring[:-1], keep[:-1]) if kept]
+    return simplified if len(simplified) >= 3 else list(points)
 
 class PolygonShape(Shape):
     """Polygon shape for segmentation"""
     
+    __slots__ = ('_points', 'closed', '_lod_cache', '_vertex_grid', '_resize_origin')
+    
+    type = 'polygon'
+    
     def __init__(self, points=None, class_id=None, image_size=(1, 1)):
         super().__init__(class_id, image_size)
-        self.type = 'polygon'
-        self.points = points or []  # List of (x, y) tuples (normalized)
+        self._lod_cache = None  # tolerance -> simplified pixel points, created on first use
+        self._vertex_grid = None  # PointGrid over pixel vertices, built on first handle lookup
+        self.points = points if points is not None else ()  # (x, y) pairs (normalized)
         self.closed = False
+        self._resize_origin = None  # Vertices before resizing started
+        
+    @property
+    def points(self):
+        """Vertices as a float64 array of shape (count, 2) (normalized)"""
+        return self._points
+    
+    @points.setter
+    def points(self, points):
+        # Always a private copy; an (n, 2) input is kept as is, since a reshape
+        # view would add a second array header to every polygon
+        points = np.array(points, dtype=np.float64)
+        if points.ndim != 2:
+            points = points.reshape(-1, 2).copy()  # No points, or a flat sequence
+        self._points = points
+        self.invalidate_geometry()
+        
+    def invalidate_geometry(self):
+        """Drop cached pixel points, bounds, simplified outlines and vertex grid"""
+        super().invalidate_geometry()
+        self._lod_cache = None
+        self._vertex_grid = None
+        
+    def copy(self):
+        """Create a copy of this polygon with its own vertex array"""
+        new_polygon = super().copy()
+        new_polygon.points = self.points
+        return new_polygon
         
     def add_point(self, x, y):
         """Add a point to the polygon (normalized coordinates)"""
-        self.points.append((x, y))
+        self.points = np.vstack((self.points, (x, y)))
         
     def from_pixel_points(self, pixel_points):
         """Set points from pixel coordinates"""
-        self.points = []
-        for px, py in pixel_points:
-            self.points.append((px / self.image_width, py / self.image_height))
+        pixel_points = np.asarray(pixel_points, dtype=np.float64).reshape(-1, 2)
+        self.points = pixel_points / (self.image_width, self.image_height)
             
     def to_pixel_points(self):
-        """Convert to pixel coordinates"""
-        pixel_points = []
-        for nx, ny in self.points:
-            px = int(nx * self.image_width)
-            py = int(ny * self.image_height)
-            pixel_points.append((px, py))
-        return pixel_points
+        """Convert to pixel coordinates (cached, do not modify the returned list)"""
+        if self._pixel_cache is None:
+            # trunc matches int() on each coordinate
+            flat = self.get_pixel_array().astype(np.int64).ravel().tolist()
+            self._pixel_cache = list(zip(flat[0::2], flat[1::2]))
+        return self._pixel_cache
+    
+    def get_pixel_array(self):
+        """Get the integer pixel vertices as a float array of shape (count, 2)"""
+        return np.trunc(self.points * (self.image_width, self.image_height))
     
     def to_pixels(self):
         """Return pixel coordinates for drawing (compatible with other shapes)"""
         return self.to_pixel_points()
     
+    def get_simplified_pixel_points(self, tolerance):
+        """Get pixel points simplified to within tolerance pixels, cached per tolerance"""
+        if self._lod_cache is None:
+            self._lod_cache = {}
+        simplified = self._lod_cache.get(tolerance)
+        if simplified is None:
+            simplified = simplify_points(self.to_pixel_points(), tolerance)
+            self._lod_cache[tolerance] = simplified
+        return simplified
+    
+    def get_bounds(self):
+        """Get the pixel bounding rect (x1, y1, x2, y2)"""
+        if self._bounds_cache is None:
+            if not len(self.points):
+                return 0, 0, 0, 0
+            pixels = self.get_pixel_array()
+            x1, y1 = pixels.min(axis=0).astype(np.int64).tolist()
+            x2, y2 = pixels.max(axis=0).astype(np.int64).tolist()
+            self._bounds_cache = (x1, y1, x2, y2)
+        return self._bounds_cache
+    
+    def get_vertex_grid(self):
+        """Get a grid over the pixel vertices for nearest-vertex lookups"""
+        if self._vertex_grid is None:
+            self._vertex_grid = PointGrid(self.to_pixel_points())
+        return self._vertex_grid
+    
     def contains_point(self, x, y):
         """Check if point is inside polygon using ray casting algorithm"""
         if not self.closed or len(self.points) < 3:
@@ -59,33 +164,41 @@ class PolygonShape(Shape):
         return inside
     
     def move(self, dx, dy):
-        """Move the polygon by delta (normalized)"""
-        new_points = []
-        for nx, ny in self.points:
-            new_points.append((nx + dx, ny + dy))
-        self.points = new_points
+        """Move the polygon by delta (normalized), in place"""
+        points = self.points
+        points += (dx, dy)
+        self.invalidate_geometry()
         
     def get_resize_handles(self):
-        """Get all vertices as resize handles"""
-        pixel_points = self.to_pixel_points()
-        handles = {}
-        for i, (px, py) in enumerate(pixel_points):
-            handles[f'vertex_{i}'] = (px, py)
-        return handles
+        """Get all vertices as resize handles, keyed by vertex index"""
+        return dict(enumerate(self.to_pixel_points()))
+    
+    def begin_resize(self):
+        """Store original vertices before resizing starts"""
+        self._resize_origin = self.points.copy()
+        return True
     
     def resize_from_handle(self, handle_name, dx, dy):
-        """Move a vertex"""
-        if handle_name.startswith('vertex_'):
-            idx = int(handle_name.split('_')[1])
-            if 0 <= idx < len(self.points):
-                nx, ny = self.points[idx]
-                self.points[idx] = (
-                    nx + dx / self.image_width,
-                    ny + dy / self.image_height
-                )
-                return True
+        """Move a vertex by a pixel delta from where it was when resizing began
+        
+        handle_name is the vertex index.
+        """
+        origin = self._resize_origin if self._resize_origin is not None else self.points
+        if isinstance(handle_name, int) and 0 <= handle_name < len(origin):
+            nx, ny = origin[handle_name]
+            self.points[handle_name] = (
+                nx + dx / self.image_width,
+                ny + dy / self.image_height
+            )
+            self.invalidate_geometry()
+            return True
         return False
     
+    def get_point_tuples(self):
+        """Get the vertices as a list of (x, y) tuples (normalized)"""
+        flat = self.points.ravel().tolist()
+        return list(zip(flat[0::2], flat[1::2]))
+    
     def close_polygon(self):
         """Close the polygon"""
         self.closed = True
@@ -96,7 +209,7 @@ class PolygonShape(Shape):
             'id': self.id,
             'type': 'polygon',
             'class_id': self.class_id,
-            'points': self.points,
+            'points': self.get_point_tuples(),
             'closed': self.closed
         }
     
@@ -109,5 +222,6 @@ class PolygonShape(Shape):
             image_size=image_size
         )
         polygon.id = data['id']
+        observe_shape_id(polygon.id)
         polygon.closed = data['closed']
         return polygon
\ No newline at end of file
@@ -1,16 +1,43 @@
 # core/shape_base.py
-import uuid
 from abc import ABC, abstractmethod
+from .id_allocator import new_shape_id
+
+def slot_names(cls):
+    """Get every slot declared along a class's MRO (cached per class)"""
+    names = cls.__dict__.get('_slot_names')
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            names.extend(name for name in slots if name not in names)
+        names = tuple(names)
+        cls._slot_names = names
+    return names
 
 class Shape(ABC):
     """Base class for all annotation shapes"""
     
+    # Slots instead of a per-instance __dict__ keep large datasets compact
+    __slots__ = ('id', 'class_id', 'image_width', 'image_height', 'selected',
+                 '_pixel_cache', '_bounds_cache')
+    
+    type = None  # Shape type name, set by each subclass
+    created_at = None  # Never set per shape, kept for compatibility
+    
     def __init__(self, class_id=None, image_size=(1, 1)):
-        self.id = str(uuid.uuid4())[:8]
+        self.id = new_shape_id()
         self.class_id = class_id
         self.image_width, self.image_height = image_size
         self.selected = False
-        self.created_at = None
+        self._pixel_cache = None  # Pixel geometry, rebuilt after coordinate changes
+        self._bounds_cache = None
+        
+    def invalidate_geometry(self):
+        """Drop cached pixel geometry after the coordinates changed"""
+        self._pixel_cache = None
+        self._bounds_cache = None
         
     @abstractmethod
     def contains_point(self, x, y):
@@ -22,6 +49,11 @@ class Shape(ABC):
         """Convert to pixel coordinates for drawing"""
         pass
     
+    @abstractmethod
+    def get_bounds(self):
+        """Get the pixel bounding rect (x1, y1, x2, y2)"""
+        pass
+    
     @abstractmethod
     def move(self, dx, dy):
         """Move the shape by delta x, y"""
@@ -39,7 +71,12 @@ class Shape(ABC):
     
     def copy(self):
         """Create a copy of this shape"""
-        new_shape = self.__class__.__new__(self.__class__)
-        new_shape.__dict__ = self.__dict__.copy()
-        new_shape.id = str(uuid.uuid4())[:8]
-        return new_shape
\ No newline at end of file
+        cls = self.__class__
+        new_shape = cls.__new__(cls)
+        for name in slot_names(cls):
+            try:
+                setattr(new_shape, name, getattr(self, name))
+            except AttributeError:
+                pass  # Slot never assigned on the original
+        new_shape.id = new_shape_id()
+        return new_shape
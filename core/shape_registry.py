@@ -0,0 +1,121 @@
+# core/shape_registry.py
+from .annotation import BoundingBox
+from .circle_shape import CircleShape
+from .ellipse_shape import EllipseShape
+from .polygon_shape import PolygonShape
+
+
+def bounds_center(shape):
+    """Get the center of a shape's pixel bounding rect"""
+    x1, y1, x2, y2 = shape.get_bounds()
+    return (x1 + x2) / 2, (y1 + y2) / 2
+
+
+class ShapeType:
+    """Operations the editor needs for one kind of shape, keyed by type name
+
+    get_geometry and set_geometry save and restore a shape's normalized
+    geometry, e.g. to cancel a move or to undo a resize. paste_anchor gives
+    the pixel point put under the cursor when the shape is pasted on its own.
+    draw(canvas, painter, shape, style, batched) is filled in by the GUI with
+    set_shape_drawer. Shapes of types
+    with vertex_handles have one resize handle per vertex, found through
+    their vertex grid; labelled types always show their class label.
+    """
+
+    def __init__(self, name, shape_class, get_geometry, set_geometry,
+                 paste_anchor=bounds_center, draw=None, vertex_handles=False, labelled=False):
+        self.name = name
+        self.shape_class = shape_class
+        self.get_geometry = get_geometry
+        self.set_geometry = set_geometry
+        self.paste_anchor = paste_anchor
+        self.draw = draw
+        self.vertex_handles = vertex_handles
+        self.labelled = labelled
+
+    def to_dict(self, shape):
+        """Serialize a shape of this type"""
+        return shape.to_dict()
+
+    def from_dict(self, data, image_size):
+        """Create a shape of this type from its to_dict() form"""
+        return self.shape_class.from_dict(data, image_size)
+
+
+# Type name -> ShapeType
+SHAPE_TYPES = {}
+
+
+def register_shape_type(shape_type):
+    """Add or replace a shape type"""
+    SHAPE_TYPES[shape_type.name] = shape_type
+    return shape_type
+
+
+def get_shape_type(shape):
+    """Get the registered type of a shape"""
+    try:
+        return SHAPE_TYPES[shape.type]
+    except KeyError:
+        raise ValueError(f"Unknown shape type: {shape.type}") from None
+
+
+def set_shape_drawer(name, draw):
+    """Set the draw function of a registered shape type"""
+    SHAPE_TYPES[name].draw = draw
+
+
+def shape_to_dict(shape):
+    """Serialize any registered shape"""
+    return get_shape_type(shape).to_dict(shape)
+
+
+def shape_from_dict(data, image_size):
+    """Create a shape of any registered type from its to_dict() form"""
+    shape_type = SHAPE_TYPES.get(data.get('type', 'box'))
+    if shape_type is None:
+        raise ValueError(f"Unknown shape type: {data.get('type')}")
+    return shape_type.from_dict(data, image_size)
+
+
+def _get_box_geometry(box):
+    return box.x, box.y, box.width, box.height
+
+
+def _set_box_geometry(box, geometry):
+    box.x, box.y, box.width, box.height = geometry
+    box.invalidate_geometry()
+
+
+def _get_circle_geometry(circle):
+    return circle.center_x, circle.center_y, circle.radius
+
+
+def _set_circle_geometry(circle, geometry):
+    circle.center_x, circle.center_y, circle.radius = geometry
+    circle.invalidate_geometry()
+
+
+def _get_ellipse_geometry(ellipse):
+    return ellipse.center_x, ellipse.center_y, ellipse.radius_x, ellipse.radius_y
+
+
+def _set_ellipse_geometry(ellipse, geometry):
+    ellipse.center_x, ellipse.center_y, ellipse.radius_x, ellipse.radius_y = geometry
+    ellipse.invalidate_geometry()
+
+
+def _get_polygon_geometry(polygon):
+    return tuple(map(tuple, polygon.points.tolist()))
+
+
+def _set_polygon_geometry(polygon, geometry):
+    polygon.points = geometry
+
+
+register_shape_type(ShapeType('box', BoundingBox, _get_box_geometry, _set_box_geometry, labelled=True))
+register_shape_type(ShapeType('circle', CircleShape, _get_circle_geometry, _set_circle_geometry))
+register_shape_type(ShapeType('ellipse', EllipseShape, _get_ellipse_geometry, _set_ellipse_geometry))
+register_shape_type(ShapeType('polygon', PolygonShape, _get_polygon_geometry, _set_polygon_geometry,
+                              vertex_handles=True))
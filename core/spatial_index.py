@@ -0,0 +1,169 @@
+# core/spatial_index.py
+import math
+
+
+class SpatialGrid:
+    """Uniform grid over shape pixel bounds for fast area and point queries"""
+
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self._cells = {}  # (col, row) -> set of item ids
+        self._bounds = {}  # item id -> (x1, y1, x2, y2)
+        self._items = {}  # item id -> item
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return id(item) in self._items
+
+    def _cell_range(self, x1, y1, x2, y2):
+        """Get the (col, row) ranges covered by a rect"""
+        size = self.cell_size
+        return (
+            range(math.floor(x1 / size), math.floor(x2 / size) + 1),
+            range(math.floor(y1 / size), math.floor(y2 / size) + 1)
+        )
+
+    def insert(self, item, bounds):
+        """Add an item with pixel bounds (x1, y1, x2, y2)"""
+        key = id(item)
+        if key in self._items:
+            self.remove(item)
+
+        x1, y1, x2, y2 = bounds
+        bounds = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        self._items[key] = item
+        self._bounds[key] = bounds
+
+        cols, rows = self._cell_range(*bounds)
+        for col in cols:
+            for row in rows:
+                self._cells.setdefault((col, row), set()).add(key)
+
+    def remove(self, item):
+        """Remove an item if present"""
+        key = id(item)
+        bounds = self._bounds.pop(key, None)
+        if bounds is None:
+            return
+        del self._items[key]
+
+        cols, rows = self._cell_range(*bounds)
+        for col in cols:
+            for row in rows:
+                cell = self._cells.get((col, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self._cells[(col, row)]
+
+    def update(self, item, bounds):
+        """Move an item to new bounds"""
+        self.insert(item, bounds)
+
+    def clear(self):
+        """Remove all items"""
+        self._cells.clear()
+        self._bounds.clear()
+        self._items.clear()
+
+    def rebuild(self, items, bounds_func):
+        """Replace the contents with items, using bounds_func(item) for their bounds"""
+        self.clear()
+        for item in items:
+            self.insert(item, bounds_func(item))
+
+    def query(self, x1, y1, x2, y2):
+        """Get all items whose bounds intersect a rect"""
+        found = set()
+        cols, rows = self._cell_range(x1, y1, x2, y2)
+
+        # Large query rects visit fewer entries by scanning the items directly
+        if len(cols) * len(rows) > len(self._items):
+            candidates = self._bounds.keys()
+        else:
+            candidates = set()
+            for col in cols:
+                for row in rows:
+                    cell = self._cells.get((col, row))
+                    if cell:
+                        candidates.update(cell)
+
+        for key in candidates:
+            bx1, by1, bx2, by2 = self._bounds[key]
+            if bx1 <= x2 and bx2 >= x1 and by1 <= y2 and by2 >= y1:
+                found.add(key)
+        return [self._items[key] for key in found]
+
+    def cell_at(self, x, y):
+        """Get the (col, row) key of the cell containing a point"""
+        size = self.cell_size
+        return math.floor(x / size), math.floor(y / size)
+
+    def query_cell(self, key):
+        """Get all items whose bounds overlap a cell"""
+        return [self._items[item_id] for item_id in self._cells.get(key, ())]
+
+    def query_point(self, x, y):
+        """Get all items whose bounds contain a point"""
+        cell = self._cells.get(self.cell_at(x, y))
+        if not cell:
+            return []
+
+        found = []
+        for key in cell:
+            bx1, by1, bx2, by2 = self._bounds[key]
+            if bx1 <= x <= bx2 and by1 <= y <= by2:
+                found.append(self._items[key])
+        return found
+
+
+class PointGrid:
+    """Uniform grid over a fixed list of points, queried by point index"""
+
+    def __init__(self, points, cell_size=None):
+        self.points = points
+
+        if cell_size is None:
+            # Aim for about one point per occupied cell
+            if points:
+                xs = [x for x, y in points]
+                ys = [y for x, y in points]
+                area = (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)
+                cell_size = max(1.0, math.sqrt(area / len(points)))
+            else:
+                cell_size = 1.0
+        self.cell_size = cell_size
+
+        self._cells = {}  # (col, row) -> list of point indices
+        for index, (x, y) in enumerate(points):
+            key = (math.floor(x / cell_size), math.floor(y / cell_size))
+            self._cells.setdefault(key, []).append(index)
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, x, y, radius):
+        """Get indices of points within radius of (x, y) on both axes, nearest first"""
+        size = self.cell_size
+        cols = range(math.floor((x - radius) / size), math.floor((x + radius) / size) + 1)
+        rows = range(math.floor((y - radius) / size), math.floor((y + radius) / size) + 1)
+
+        # Large radii visit fewer entries by scanning the points directly
+        if len(cols) * len(rows) > len(self.points):
+            candidates = range(len(self.points))
+        else:
+            candidates = []
+            for col in cols:
+                for row in rows:
+                    candidates.extend(self._cells.get((col, row), ()))
+
+        found = []
+        for index in candidates:
+            px, py = self.points[index]
+            dx, dy = px - x, py - y
+            if abs(dx) <= radius and abs(dy) <= radius:
+                found.append((dx * dx + dy * dy, index))
+        found.sort()
+        return [index for _, index in found]
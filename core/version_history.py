@@ -0,0 +1,293 @@
+# core/version_history.py
+import sys
+import time
+from collections import namedtuple
+
+from .history import History, AddShapes, RemoveShapes, CommandGroup, estimate_size, shape_size
+from .shape_registry import get_shape_type
+
+# Immutable state of one shape in one version. The shape object itself is
+# only used as an identity key; geometry is a tuple from get_geometry.
+ShapeRecord = namedtuple('ShapeRecord', 'shape geometry class_id')
+
+# Shapes that differ between two versions
+VersionDiff = namedtuple('VersionDiff', 'added removed changed')
+
+
+def make_record(shape):
+    """Freeze the current state of a shape"""
+    return ShapeRecord(shape, get_shape_type(shape).get_geometry(shape), shape.class_id)
+
+
+def make_state(shapes):
+    """Freeze a list of shapes into a version"""
+    return tuple(make_record(shape) for shape in shapes)
+
+
+def diff_states(old, new):
+    """Compare two versions; changed holds (old record, new record) pairs"""
+    if len(old) == len(new):
+        pairs = [(a, b) for a, b in zip(old, new) if a is not b]
+        if all(a.shape is b.shape for a, b in pairs):
+            # Same shapes in the same order: skip the records both versions share
+            return VersionDiff([], [], [(a, b) for a, b in pairs if a[1:] != b[1:]])
+
+    old_records = {id(record.shape): record for record in old}
+    new_ids = set()
+    added = []
+    changed = []
+    for record in new:
+        key = id(record.shape)
+        new_ids.add(key)
+        previous = old_records.get(key)
+        if previous is None:
+            added.append(record)
+        elif previous is not record and previous[1:] != record[1:]:
+            changed.append((previous, record))
+    removed = [record for record in old if id(record.shape) not in new_ids]
+    return VersionDiff(added, removed, changed)
+
+
+def record_size(record):
+    """Rough size in bytes of a record, not counting its shape"""
+    return sys.getsizeof(record) + estimate_size(record.geometry)
+
+
+def restore_record(record):
+    """Put a shape back into the state of a record"""
+    get_shape_type(record.shape).set_geometry(record.shape, record.geometry)
+    record.shape.class_id = record.class_id
+
+
+class VersionHistory:
+    """History engine keeping whole versions as immutable tuples of shape records
+
+    Consecutive versions share the records of unchanged shapes, so saving a
+    version costs one pointer per shape plus a record per changed shape, and
+    holding on to a version is a pointer copy. Any two versions can be
+    compared, and the target can be moved to any kept version in one step.
+    It is a drop-in alternative to History, grouping and coalescing the
+    same way: a closed group or a run of merged pushes leaves one version.
+    """
+
+    merge_window = History.merge_window
+
+    def __init__(self, max_size=50, shapes=()):
+        self.max_size = max_size
+        self.versions = [make_state(shapes)]
+        self.sizes = [0]  # Rough bytes each version added; the starting version is the image itself
+        self.position = 0  # Index of the target's current version
+        self._positions = None  # Shape id -> index in the current version, or None when stale
+        self._group_start = None  # Position when the open group began, -1 once that version is evicted
+        self._group_depth = 0
+        self._last_command = None  # Last coalescing command, while it can still be merged into
+        self._last_push = 0.0
+        self._top_command = None  # Command that made the newest version, while the target is at it
+
+    @property
+    def current(self):
+        """The version the target is at"""
+        return self.versions[self.position]
+
+    @property
+    def undo_count(self):
+        return self.position
+
+    @property
+    def redo_count(self):
+        return len(self.versions) - 1 - self.position
+
+    @property
+    def size_bytes(self):
+        """Rough memory held by the kept versions"""
+        return sum(self.sizes)
+
+    def derive(self, command, state=None):
+        """Get the version after a command, sharing every record it did not touch
+
+        Returns the version and the rough bytes it adds.
+        """
+        if state is None:
+            state = self.current
+        if isinstance(command, CommandGroup):
+            total = 0
+            for part in command.commands:
+                state, size = self.derive(part, state)
+                total += size
+            return state, total
+        if isinstance(command, AddShapes):
+            if self._positions is not None:
+                for index, shape in enumerate(command.shapes, len(state)):
+                    self._positions[id(shape)] = index
+            added = make_state(command.shapes)
+            return state + added, sum(map(record_size, added))
+        if isinstance(command, RemoveShapes):
+            removed = {id(shape) for _, shape in command.entries}
+            self._positions = None
+            # Removed shapes live on only in the history
+            return (tuple(record for record in state if id(record.shape) not in removed),
+                    sum(shape_size(shape) for _, shape in command.entries))
+
+        # Any other command changes its shapes in place, keeping every index
+        if self._positions is None:
+            self._positions = {id(record.shape): index for index, record in enumerate(state)}
+        records = list(state)
+        size = 0
+        for shape in command.shapes:
+            record = make_record(shape)
+            records[self._positions[id(shape)]] = record
+            size += record_size(record)
+        return tuple(records), size
+
+    def begin_group(self):
+        """Collapse the versions pushed from now on into one; groups nest"""
+        if self._group_depth == 0:
+            self._group_start = self.position
+        self._group_depth += 1
+
+    def end_group(self):
+        """Close a group, keeping only its last version"""
+        if self._group_depth == 0:
+            return
+        self._group_depth -= 1
+        if self._group_depth:
+            return
+        start, self._group_start = self._group_start, None
+        if start < 0:
+            # The version before the group is gone, so the group can no longer
+            # be undone: its last version becomes the oldest
+            self.sizes[self.position] = sum(self.sizes[:self.position + 1])
+            del self.versions[:self.position]
+            del self.sizes[:self.position]
+            self.position = 0
+            self._top_command = None
+        elif self.position - start > 1:
+            self.sizes[self.position] = sum(self.sizes[start + 1:self.position + 1])
+            del self.versions[start + 1:self.position]
+            del self.sizes[start + 1:self.position]
+            self.position = start + 1
+            self._top_command = None
+
+    def push(self, command, coalesce=False):
+        """Record a command that has just been applied, as a new version"""
+        state, size = self.derive(command)
+        now = time.monotonic()
+        last_command, self._last_command = self._last_command, command if coalesce else None
+        if (coalesce and last_command is not None and now - self._last_push <= self.merge_window
+                and self.position == len(self.versions) - 1
+                and self.position > (0 if self._group_start is None else self._group_start)
+                and last_command.merge(command)):
+            # Continue the last version rather than adding one
+            self.versions[self.position] = state
+            self._last_command = last_command
+            self._last_push = now
+            return
+        self._last_push = now
+        self._top_command = command
+
+        del self.versions[self.position + 1:]  # A new edit ends the redo chain
+        del self.sizes[self.position + 1:]
+        self.versions.append(state)
+        self.sizes.append(sys.getsizeof(state) + size)
+        if len(self.versions) > self.max_size + 1:
+            self._drop_oldest()
+        self.position = len(self.versions) - 1
+
+    def discard(self, command):
+        """Forget the version a command made without restoring the one before, if it is still the newest
+
+        Returns True if it was dropped.
+        """
+        if self._group_depth or command is not self._top_command:
+            return False
+        self.versions.pop()
+        self.sizes.pop()
+        self.position -= 1
+        self._positions = None
+        self._last_command = None
+        self._top_command = None
+        return True
+
+    def checkout(self, target, position):
+        """Bring the target to a kept version, changing only the shapes that differ"""
+        old = self.current
+        new = self.versions[position]
+        self.position = position
+        self._last_command = None
+        self._top_command = None
+        if old is new:
+            return new
+        self._positions = None
+
+        diff = diff_states(old, new)
+        if diff.removed:
+            target.remove_shapes([record.shape for record in diff.removed])
+        for _, record in diff.changed:
+            restore_record(record)
+            target.shape_geometry_changed(record.shape)
+        if diff.added:
+            for record in diff.added:
+                restore_record(record)
+            added = {id(record.shape) for record in diff.added}
+            target.insert_shapes([(index, record.shape) for index, record in enumerate(new)
+                                  if id(record.shape) in added])
+        return new
+
+    def undo(self, target):
+        """Go back one version, returning it, or None when there is nothing to undo"""
+        if self.position == 0:
+            return None
+        return self.checkout(target, self.position - 1)
+
+    def redo(self, target):
+        """Go forward one version, returning it, or None"""
+        if self.position == len(self.versions) - 1:
+            return None
+        return self.checkout(target, self.position + 1)
+
+    def compare(self, position, other=None):
+        """Diff a kept version against another one, by default the current version"""
+        return diff_states(self.versions[position], self.current if other is None else self.versions[other])
+
+    def view(self, position):
+        """Get detached copies of the shapes as they were in a kept version"""
+        shapes = []
+        for record in self.versions[position]:
+            shape = record.shape.copy()
+            shape.id = record.shape.id  # Same annotation, as it was then
+            shape.selected = False
+            restore_record(record._replace(shape=shape))
+            shapes.append(shape)
+        return shapes
+
+    def _drop_oldest(self):
+        """Drop the oldest version, returning the bytes it added"""
+        self.versions.pop(0)
+        if self._group_start is not None:
+            self._group_start = max(self._group_start - 1, -1)
+        return self.sizes.pop(0)
+
+    def evict_oldest(self):
+        """Drop the oldest version, or the furthest redo version when the target is at the oldest
+
+        Returns the bytes freed, or None when only the current version is left.
+        """
+        if self.position > 0:
+            self.position -= 1
+            return self._drop_oldest()
+        if len(self.versions) > 1:
+            self.versions.pop()
+            self._top_command = None
+            return self.sizes.pop()
+        return None
+
+    def clear(self, shapes=()):
+        """Drop all versions, starting again from the given shapes"""
+        self.versions = [make_state(shapes)]
+        self.sizes = [0]
+        self.position = 0
+        self._positions = None
+        self._group_start = None
+        self._group_depth = 0
+        self._last_command = None
+        self._top_command = None
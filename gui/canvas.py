@@ -4,11 +4,18 @@ from PyQt5.QtCore import Qt, QPoint, pyqtSignal, QRect, QPointF, QTimer
 from PyQt5.QtGui import QPainter, QPixmap, QColor, QPen, QBrush, QFont, QPolygonF, QCursor
 import os
 import math
+import time
 
 from core.annotation import BoundingBox
 from core.polygon_shape import PolygonShape
 from core.circle_shape import CircleShape
 from core.ellipse_shape import EllipseShape
+from core.spatial_index import SpatialGrid
+from core.shape_registry import get_shape_type, set_shape_drawer
+from core.history import ImageHistories, DEFAULT_HISTORY_BUDGET, AddShapes, RemoveShapes, MoveShapes, MoveVertex, ResizeShape, ChangeClass
+from gui.image_renderer import create_image_renderer
+from gui.style_cache import StyleCache, ShapeStyle, SELECTED_COLOR
+from gui.perf_hud import PerfStats, PerformanceHud
 
 class AnnotationCanvas(QWidget):
     """Canvas widget for displaying images and annotations"""
@@ -16,6 +23,7 @@ class AnnotationCanvas(QWidget):
     # Signals
     position_changed = pyqtSignal(int, int)  # Emitted when mouse moves
     shape_selected = pyqtSignal(str)  # Emitted when shape is selected
+    history_changed = pyqtSignal(object)  # Emitted with the bytes held by undo histories
     
     def __init__(self):
         """Initialize the canvas"""
@@ -29,7 +37,7 @@ class AnnotationCanvas(QWidget):
         self.image = None
         self.image_path = None
         self.pixmap = None
-        self.scaled_pixmap = None
+        self.image_renderer = None
         self.image_width = 0
         self.image_height = 0
         
@@ -51,6 +59,13 @@ class AnnotationCanvas(QWidget):
         self.pan_mode = False  # Whether we're in pan mode
         self.original_cursor = None  # Store original cursor
         
+        # Fast image filtering while interacting, smooth once idle
+        self.interacting = False
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(150)
+        self.idle_timer.timeout.connect(self.on_interaction_idle)
+        
         # Mode
         self.mode = 'yolo'  # 'yolo' or 'unet'
         
@@ -62,7 +77,16 @@ class AnnotationCanvas(QWidget):
         self.drawing = False
         self.start_point = None
         self.current_shape = None
-        self.selected_shape = None
+        self.selected_shape = None  # Most recently selected shape, owner of the resize handles
+        self.selected_shapes = []  # Every selected shape
+        
+        # Rubber-band selection (widget coordinates)
+        self.rubber_band_origin = None
+        self.rubber_band_rect = None
+        self.rubber_band_additive = False  # Shift held: add to the selection
+        
+        # Geometry of the shape being resized, for its undo step
+        self.resize_original_geometry = None
         
         # Resize variables
         self.resizing = False
@@ -71,31 +95,75 @@ class AnnotationCanvas(QWidget):
         
         # Drag-copy variables
         self.drag_copy = False
-        self.drag_copy_shape = None
+        self.drag_copy_shapes = []
         self.drag_start_pos = None
-        self.original_shape = None
+        self.original_shapes = []
         
         # Paste variables
-        self.clipboard_shape = None
+        self.clipboard_shapes = []
         self.pasting = False
-        self.paste_shape = None
+        self.paste_shapes = []
+        self.paste_command = None  # Undo step of the pending paste
         self.paste_start_pos = None
         self.paste_confirmed = False
         
         # Polygon drawing state
         self.drawing_polygon = False
         
-        # Undo/Redo stacks
-        self.undo_stack = []  # Stack of actions for undo
-        self.redo_stack = []  # Stack of actions for redo
+        # Undo/Redo history of edit commands, one per image under a shared memory budget
         self.max_stack_size = 50  # Maximum undo steps
+        self.histories = ImageHistories(budget_bytes=DEFAULT_HISTORY_BUDGET, max_size=self.max_stack_size)
+        self.history = self.histories.visit(None)
         
         # Resize handle size (pixels)
         self.handle_size = 8
         
+        # Cached pens, brushes and fonts per class
+        self.style_cache = StyleCache()
+        self.preview_style = ShapeStyle(SELECTED_COLOR)
+        
+        # Cached image + inactive shapes layer
+        self.static_layer = None
+        self.static_layer_key = None
+        self.last_view_key = None  # View of the previous frame, to tell when the view is moving
+        self.layer_version = 0  # Bumped whenever the cached layer goes stale
+        
+        # Spatial index over shape pixel bounds, used for culling and hit-testing
+        self.spatial_index = SpatialGrid()
+        self.spatial_index_dirty = True
+        self.shape_order = {}  # id(shape) -> z-order key (higher is on top)
+        self.next_shape_order = 0
+        self.cull_margin = 150  # Widget pixels kept around the viewport for labels
+        self.shapes_drawn = 0
+        self.shapes_culled = 0
+        
+        # Polygons are drawn simplified below this zoom level
+        self.lod_max_scale = 1.0
+        
+        # Performance overlay
+        self.perf_stats = PerfStats()
+        self.perf_hud = PerformanceHud()
+        
+        # Hover highlight, hit-tested only against the shapes in the cursor's grid cell
+        self.hover_enabled = True
+        self.hovered_shape = None
+        self.hovered_handle = None  # Handle of the selected shape under the cursor
+        self.hover_cell = None
+        self.hover_candidates = []  # Shapes overlapping hover_cell, topmost first
+        self.hover_version = -1  # layer_version the candidates were collected at
+        
         # Enable mouse tracking for position updates
         self.setMouseTracking(True)
         
+        # Mouse moves beyond one per display frame are coalesced
+        self.pending_move = None  # (pos, buttons) of the latest held-back move
+        self.dropped_move_events = 0
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setTimerType(Qt.PreciseTimer)
+        self.frame_timer.setInterval(self.get_frame_interval())
+        self.frame_timer.timeout.connect(self.on_frame_timer)
+        
         # Enable keyboard focus
         self.setFocusPolicy(Qt.StrongFocus)
         self.setFocus()
@@ -103,7 +171,7 @@ class AnnotationCanvas(QWidget):
         # State Variabeles
         self.moving = False  # Whether we're moving a shape
         self.move_start_pos = None  # Starting position for move
-        self.move_original_positions = []  # Store original positions for undo
+        self.move_offset = (0.0, 0.0)  # Normalized distance moved so far, for cancel and undo
 
         
         print("✅ Canvas initialized")
@@ -111,20 +179,42 @@ class AnnotationCanvas(QWidget):
     def set_class_manager(self, class_manager):
         """Set the class manager reference"""
         self.class_manager = class_manager
+        self.style_cache.class_manager = class_manager
+        self.style_cache.clear()
         
     def load_image(self, image_path):
         """Load an image from file"""
         try:
-            self.image_path = image_path
-            self.pixmap = QPixmap(image_path)
+            # Read the image first; a failed load leaves the current image and shapes as they are
+            image_renderer = create_image_renderer(image_path)
             
-            if not self.pixmap.isNull():
-                self.image_width = self.pixmap.width()
-                self.image_height = self.pixmap.height()
+            if image_renderer:
+                # Keep the previous image's shapes to go with its undo history;
+                # reloading the same image keeps its shapes in place
+                reloading = image_path == self.image_path
+                if self.image_path is not None:
+                    self.set_selection([])
+                    if not reloading:
+                        self.histories.stash(self.image_path, self.shapes)
+                
+                self.image_path = image_path
+                self.image_renderer = image_renderer
+                
+                # Huge images are tiled and never held as a single QPixmap
+                self.pixmap = getattr(image_renderer, 'pixmap', None)
                 
-                # Clear previous shapes when loading new image
-                self.shapes = []
+                self.image_width = image_renderer.width
+                self.image_height = image_renderer.height
+                self.spatial_index = SpatialGrid(cell_size=max(64, max(self.image_width, self.image_height) // 64))
+                
+                # Bring back the shapes and undo history from an earlier visit, if any
+                if not reloading:
+                    self.shapes = self.histories.unstash(image_path)
                 self.selected_shape = None
+                self.selected_shapes = []
+                self.mark_shapes_changed()
+                self.history = self.histories.visit(image_path, self.shapes)
+                self.history_changed.emit(self.histories.enforce_budget())
                 
                 # Reset all drawing states
                 self.reset_all_states()
@@ -139,6 +229,122 @@ class AnnotationCanvas(QWidget):
         except Exception as e:
             print(f"Error loading image: {e}")
 
+    def invalidate_static_layer(self):
+        """Mark the cached image + shapes layer as stale"""
+        self.layer_version += 1
+        
+    def mark_shapes_changed(self):
+        """Mark the shape set or shape geometry as changed"""
+        self.spatial_index_dirty = True
+        self.hovered_shape = None
+        self.hovered_handle = None
+        self.invalidate_static_layer()
+        
+    def ensure_spatial_index(self):
+        """Rebuild the spatial index and z-order map if shapes changed"""
+        if not self.spatial_index_dirty:
+            return
+        self.spatial_index.rebuild(self.shapes, lambda shape: shape.get_bounds())
+        self.shape_order = {id(shape): i for i, shape in enumerate(self.shapes)}
+        self.next_shape_order = len(self.shapes)
+        self.spatial_index_dirty = False
+        
+    def add_shape(self, shape):
+        """Append a shape on top of the others and index it"""
+        self.shapes.append(shape)
+        if not self.spatial_index_dirty:
+            self.spatial_index.insert(shape, shape.get_bounds())
+            self.shape_order[id(shape)] = self.next_shape_order
+            self.next_shape_order += 1
+        self.invalidate_static_layer()
+        
+    def add_shapes(self, shapes):
+        """Append several shapes on top of the others"""
+        for shape in shapes:
+            self.add_shape(shape)
+        
+    def insert_shapes(self, entries):
+        """Put shapes back at (list index, shape) positions, e.g. to undo a delete"""
+        for index, shape in sorted(entries, key=lambda entry: entry[0]):
+            self.shapes.insert(index, shape)
+            if self.spatial_index_dirty:
+                continue
+            
+            # Give the shape a z-order key between its neighbours'
+            below = self.shape_order[id(self.shapes[index - 1])] if index > 0 else -1
+            above = self.shape_order[id(self.shapes[index + 1])] if index + 1 < len(self.shapes) else self.next_shape_order
+            key = (below + above) / 2
+            if not below < key < above:
+                self.spatial_index_dirty = True  # Keys ran out of precision: renumber on the next rebuild
+                continue
+            self.shape_order[id(shape)] = key
+            self.spatial_index.insert(shape, shape.get_bounds())
+        self.invalidate_static_layer()
+        
+    def remove_shape(self, shape):
+        """Remove a shape from the list and the index"""
+        self.remove_shapes([shape])
+        
+    def remove_shapes(self, shapes):
+        """Remove several shapes from the list and the index in one pass"""
+        removed = {id(shape) for shape in shapes}
+        self.shapes = [shape for shape in self.shapes if id(shape) not in removed]
+        # Remaining z-order keys stay increasing, so they need no renumbering
+        for shape in shapes:
+            self.spatial_index.remove(shape)
+            self.shape_order.pop(id(shape), None)
+        if self.hovered_shape is not None and id(self.hovered_shape) in removed:
+            self.hovered_shape = None
+        self.invalidate_static_layer()
+        
+    def shape_geometry_changed(self, shape):
+        """Re-index a shape after it was moved or resized"""
+        if not self.spatial_index_dirty and shape in self.spatial_index:
+            self.spatial_index.update(shape, shape.get_bounds())
+        self.invalidate_static_layer()
+        
+    def find_shape_at(self, image_x, image_y):
+        """Get the topmost shape containing an image point, or None"""
+        self.ensure_spatial_index()
+        candidates = self.spatial_index.query_point(image_x, image_y)
+        candidates.sort(key=lambda shape: self.shape_order[id(shape)], reverse=True)
+        for shape in candidates:
+            if shape.contains_point(image_x, image_y):
+                return shape
+        return None
+        
+    def on_classes_changed(self):
+        """Redraw shapes after class names or colors change"""
+        self.style_cache.clear()
+        self.invalidate_static_layer()
+        self.update()
+        
+    def get_frame_interval(self):
+        """Get the display frame interval in milliseconds"""
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 60.0
+        if refresh_rate <= 0:
+            refresh_rate = 60.0
+        return max(1, int(1000 / refresh_rate))
+        
+    def set_perf_hud_visible(self, visible):
+        """Show or hide the performance HUD"""
+        self.perf_hud.visible = visible
+        self.perf_stats.reset()
+        self.update()
+        print(f"📊 Performance HUD {'shown' if visible else 'hidden'}")
+        
+    def set_hover_enabled(self, enabled):
+        """Turn hover highlighting on or off"""
+        self.hover_enabled = enabled
+        if not enabled:
+            self.set_hover(None, None)
+        print(f"🖱️ Hover highlight {'on' if enabled else 'off'}")
+        
+    def has_image(self):
+        """Check whether an image is loaded and drawable"""
+        return self.image_renderer is not None
+
     def set_mode(self, mode):
         """Set the annotation mode"""
         self.mode = mode
@@ -147,7 +353,7 @@ class AnnotationCanvas(QWidget):
                 
     def fit_to_window(self):
         """Scale image to fit the window"""
-        if self.pixmap and not self.pixmap.isNull():
+        if self.has_image():
             widget_width = self.width()
             widget_height = self.height()
             
@@ -168,12 +374,24 @@ class AnnotationCanvas(QWidget):
         """Zoom in by 20%"""
         self.scale *= 1.2
         self.scale = min(10.0, self.scale)
+        self.mark_interacting()
         self.update()
         
     def zoom_out(self):
         """Zoom out by 20%"""
         self.scale *= 0.8
         self.scale = max(0.1, self.scale)
+        self.mark_interacting()
+        self.update()
+        
+    def mark_interacting(self):
+        """Switch to fast image filtering until the user goes idle"""
+        self.interacting = True
+        self.idle_timer.start()
+        
+    def on_interaction_idle(self):
+        """Repaint with smooth filtering once interaction has stopped"""
+        self.interacting = False
         self.update()
         
     def start_drawing(self, pos):
@@ -198,6 +416,7 @@ class AnnotationCanvas(QWidget):
         """Update the current shape while drawing"""
         if self.drawing and self.start_point and self.current_shape:
             current_pos = self.widget_to_image(pos)
+            old_rect = self.shape_widget_rect(self.current_shape)
             
             if isinstance(self.current_shape, BoundingBox):
                 x1 = min(self.start_point[0], current_pos[0])
@@ -209,7 +428,7 @@ class AnnotationCanvas(QWidget):
                     x1, y1, x2, y2,
                     self.image_width, self.image_height
                 )
-            self.update()
+            self.update_shape_area(old_rect, self.current_shape)
         
     def finish_drawing(self):
         """Finish drawing and add the shape to the list"""
@@ -218,8 +437,8 @@ class AnnotationCanvas(QWidget):
             current_class = self.class_manager.get_current_class()
             if current_class:
                 self.current_shape.class_id = current_class.id
-                self.save_state()  # Save state before adding
-                self.shapes.append(self.current_shape)
+                self.add_shape(self.current_shape)
+                self.push_command(AddShapes([self.current_shape]))
                 shape_type = getattr(self.current_shape, 'type', 'box')
                 print(f"✅ Added new {shape_type} with class: {current_class.name}")
                 
@@ -229,84 +448,106 @@ class AnnotationCanvas(QWidget):
         self.update()
         
     def select_shape(self, pos):
-        """Select a shape at the given position - only one shape at a time"""
-        if not self.shapes:
-            self.selected_shape = None
-            self.shape_selected.emit("none")
-            return
-            
-        # First, deselect ALL shapes
-        for shape in self.shapes:
-            shape.selected = False
-            
-        # Check each shape (from top to bottom)
+        """Select the topmost shape at the given position, or clear the selection"""
         image_x, image_y = self.widget_to_image(pos)
-        selected = False
-        for shape in reversed(self.shapes):
-            if hasattr(shape, 'contains_point') and shape.contains_point(image_x, image_y):
-                shape.selected = True
-                self.selected_shape = shape
-                selected = True
-                # Print selected shape info
-                if self.class_manager and shape.class_id:
-                    cls = self.class_manager.get_class(shape.class_id)
-                    if cls:
-                        shape_type = getattr(shape, 'type', 'box')
-                        print(f"🔍 Selected {shape_type}: {cls.name}")
-                        self.shape_selected.emit(shape_type)
-                break
-        
-        if not selected:
-            self.selected_shape = None
-            self.shape_selected.emit("none")
+        shape = self.find_shape_at(image_x, image_y)
+        self.set_selection([shape] if shape else [])
+        
+        if shape:
+            # Print selected shape info
+            if self.class_manager and shape.class_id:
+                cls = self.class_manager.get_class(shape.class_id)
+                if cls:
+                    print(f"🔍 Selected {getattr(shape, 'type', 'box')}: {cls.name}")
+        else:
             print("👆 Clicked on empty area")
-                    
+        self.emit_selection()
         self.update()
         
+    def set_selection(self, shapes):
+        """Replace the selection; the last shape becomes selected_shape"""
+        for shape in self.selected_shapes:
+            shape.selected = False
+        self.selected_shapes = list(shapes)
+        for shape in self.selected_shapes:
+            shape.selected = True
+        self.selected_shape = self.selected_shapes[-1] if self.selected_shapes else None
+        self.invalidate_static_layer()
+        
+    def toggle_selection(self, shape):
+        """Add a shape to the selection or remove it if already selected"""
+        if shape.selected:
+            self.set_selection([s for s in self.selected_shapes if s is not shape])
+        else:
+            self.set_selection(self.selected_shapes + [shape])
+        self.emit_selection()
+        self.update()
+        
+    def emit_selection(self):
+        """Tell listeners what is selected"""
+        count = len(self.selected_shapes)
+        if count == 0:
+            self.shape_selected.emit("none")
+        elif count == 1:
+            self.shape_selected.emit(getattr(self.selected_shape, 'type', 'box'))
+        else:
+            self.shape_selected.emit(f"{count} shapes")
+        
     def delete_selected(self):
-        """Delete the selected shape"""
-        if self.selected_shape:
-            self.save_state()  # Save state before deleting
-            self.shapes.remove(self.selected_shape)
-            self.selected_shape = None
+        """Delete all selected shapes as one undo step"""
+        if self.selected_shapes:
+            count = len(self.selected_shapes)
+            command = RemoveShapes(self.selected_shapes, self.shapes)
+            self.remove_shapes(self.selected_shapes)
+            self.push_command(command)
+            self.set_selection([])
             self.shape_selected.emit("none")
             self.update()
-            print("🗑️ Deleted selected shape")
+            print(f"🗑️ Deleted {count} selected shape(s)")
         
     def paintEvent(self, event):
         """Handle painting events"""
+        # Repaints of just the HUD itself are not counted as frames
+        hud_rect = self.perf_hud.get_rect(self.width())
+        hud_only = self.perf_hud.visible and hud_rect.contains(event.rect())
+        if not hud_only:
+            self.perf_stats.begin_frame()
+        
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         
-        # Fill background
-        painter.fillRect(self.rect(), QColor(30, 30, 30))
-        
         # Draw image if loaded
-        if self.pixmap and not self.pixmap.isNull():
-            # Calculate scaled dimensions
-            scaled_width = int(self.image_width * self.scale)
-            scaled_height = int(self.image_height * self.scale)
-            
-            # Scale the pixmap
-            self.scaled_pixmap = self.pixmap.scaled(
-                scaled_width, scaled_height,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            
-            # Draw the image
-            painter.drawPixmap(
-                int(self.offset_x), int(self.offset_y),
-                self.scaled_pixmap
-            )
+        if self.has_image():
+            # Blit the cached image + inactive shapes, then the shapes being edited.
+            # While panning or zooming the view differs every frame, so a cached
+            # layer would never be reused: draw everything directly instead.
+            # HUD refreshes reuse an up-to-date layer but never build one.
+            active_shapes = self.get_active_shapes()
+            view_key = self.get_view_key()
+            blit_ms = 0.0
+            if hud_only:
+                if self.static_layer is not None and self.static_layer_key == self.get_static_layer_key(active_shapes):
+                    painter.drawPixmap(0, 0, self.static_layer)
+                else:
+                    self.draw_static_content(painter, active_shapes, smooth=not self.interacting, timed=False)
+            elif view_key != self.last_view_key and (self.static_layer_key is None or self.static_layer_key[0] != view_key):
+                self.last_view_key = view_key
+                self.draw_static_content(painter, active_shapes, smooth=not self.interacting)
+            else:
+                self.last_view_key = view_key
+                layer = self.get_static_layer(active_shapes)
+                start = time.perf_counter()
+                painter.drawPixmap(0, 0, layer)
+                blit_ms = (time.perf_counter() - start) * 1000
             
-            # Draw all shapes
-            self.draw_shapes(painter)
+            start = time.perf_counter()
+            for shape in active_shapes:
+                self.draw_shape(painter, shape)
             
             # Draw current shape if drawing
             if self.drawing and self.current_shape:
                 if isinstance(self.current_shape, BoundingBox):
-                    self.draw_single_box(painter, self.current_shape, QColor(255, 255, 0))
+                    self.draw_single_box(painter, self.current_shape, self.preview_style)
             
             # Draw polygon preview if drawing polygon
             if self.polygon_points and len(self.polygon_points) > 0:
@@ -316,9 +557,21 @@ class AnnotationCanvas(QWidget):
             if self.circle_center and self.circle_radius > 0:
                 self.draw_circle_preview(painter)
 
-            # Draw circle preview if drawing circle
+            # Draw ellipse preview if drawing ellipse
             if hasattr(self, 'ellipse_center') and self.ellipse_center and self.ellipse_radius_x > 0:
                 self.draw_ellipse_preview(painter)    
+            
+            # Hover highlight and selection rectangle on top of the cached layer
+            self.draw_hover(painter)
+            self.draw_rubber_band(painter)
+            
+            if not hud_only:
+                self.perf_stats.blit_ms = blit_ms
+                self.perf_stats.active_ms = (time.perf_counter() - start) * 1000
+                
+        else:
+            # Fill background
+            painter.fillRect(self.rect(), QColor(30, 30, 30))
                 
         # Draw mode indicator
         painter.setPen(QPen(QColor(200, 200, 200), 1))
@@ -346,31 +599,178 @@ class AnnotationCanvas(QWidget):
                 painter.setFont(QFont("Arial", 10))
                 painter.drawText(10, 90, f"Class: {current_class.name}")
         
-    def draw_shapes(self, painter):
-        """Draw all shapes"""
-        for shape in self.shapes:
-            # Get class color
-            color = QColor(0, 255, 0)  # Default green
-            if self.class_manager and hasattr(shape, 'class_id') and shape.class_id:
-                cls = self.class_manager.get_class(shape.class_id)
-                if cls:
-                    color = QColor(cls.color)
-            
-            # Draw based on shape type
-            if hasattr(shape, 'type'):
-                if shape.type == 'box' or isinstance(shape, BoundingBox):
-                    self.draw_single_box(painter, shape, color)
-                elif shape.type == 'polygon':
-                    self.draw_polygon(painter, shape, color)
-                elif shape.type == 'circle':
-                    self.draw_circle(painter, shape, color)
-                elif shape.type == 'ellipse':
-                    self.draw_ellipse(painter, shape, color)
+        if not hud_only:
+            self.perf_stats.end_frame()
+        
+        # Draw performance HUD, refreshing it once this frame's numbers are in
+        if self.perf_hud.visible:
+            self.perf_hud.draw(painter, self)
+            if not hud_only:
+                self.update(hud_rect)
+        
+    def get_active_shapes(self):
+        """Get the shapes being moved, resized or drag-copied"""
+        if self.moving:
+            return self.selected_shapes
+        if self.resizing and self.selected_shape:
+            return [self.selected_shape]
+        if self.drag_copy:
+            return self.drag_copy_shapes
+        return []
+        
+    def get_view_key(self):
+        """Get what the static layer depends on besides the shapes"""
+        return (self.width(), self.height(), self.scale, self.offset_x, self.offset_y)
+        
+    def get_static_layer_key(self, active_shapes=()):
+        """Get what the static layer depends on"""
+        return (self.get_view_key(), self.layer_version, tuple(id(shape) for shape in active_shapes))
+        
+    def get_static_layer(self, active_shapes=()):
+        """Get the cached background, image and all shapes except the active ones"""
+        key = self.get_static_layer_key(active_shapes)
+        if self.static_layer is not None and self.static_layer_key == key:
+            self.perf_stats.layer_hits += 1
+            return self.static_layer
+        self.perf_stats.layer_misses += 1
+        
+        ratio = self.devicePixelRatioF()
+        layer = QPixmap(self.size() * ratio)
+        layer.setDevicePixelRatio(ratio)
+        
+        # The layer is only built for a still view, so it always gets smooth filtering
+        painter = QPainter(layer)
+        painter.setRenderHint(QPainter.Antialiasing)
+        self.draw_static_content(painter, active_shapes, smooth=True)
+        painter.end()
+        
+        self.static_layer = layer
+        self.static_layer_key = key
+        return layer
+        
+    def draw_static_content(self, painter, active_shapes=(), smooth=True, timed=True):
+        """Draw the background, image and all shapes except the active ones
+
+        timed=False leaves the HUD timings alone, for repaints of the HUD itself.
+        """
+        painter.fillRect(self.rect(), QColor(30, 30, 30))
+        
+        # Draw the image through the view transform
+        start = time.perf_counter()
+        self.image_renderer.draw(painter, self.scale, self.offset_x, self.offset_y, smooth=smooth)
+        image_ms = (time.perf_counter() - start) * 1000
+        
+        # Draw all shapes
+        start = time.perf_counter()
+        self.draw_shapes(painter, skip={id(shape) for shape in active_shapes})
+        if timed:
+            self.perf_stats.image_ms = image_ms
+            self.perf_stats.layer_shapes_ms = (time.perf_counter() - start) * 1000
+        
+    def draw_shapes(self, painter, skip=()):
+        """Draw the shapes in view in z-order, leaving out the ids in skip
+
+        Consecutive unselected shapes of the same class are drawn as one batch,
+        so painter state changes once per run while the stacking order stays
+        the one find_shape_at uses.
+        """
+        visible = self.get_visible_shapes()
+        
+        drawn = 0
+        run = []
+        for shape in visible:
+            if id(shape) in skip:
+                continue
+            drawn += 1
+            if shape.selected:
+                self.draw_shape_run(painter, run)
+                run = []
+                self.draw_shape(painter, shape)
+            elif run and run[0].class_id != shape.class_id:
+                self.draw_shape_run(painter, run)
+                run = [shape]
             else:
-                # Default to box for backward compatibility
-                self.draw_single_box(painter, shape, color)
+                run.append(shape)
+        self.draw_shape_run(painter, run)
+        
+        self.shapes_drawn = drawn
+        self.shapes_culled = len(self.shapes) - len(visible)
+        
+    def draw_shape_run(self, painter, shapes):
+        """Draw unselected shapes of one class, setting painter state once"""
+        if not shapes:
+            return
+        style = self.style_cache.get_style(shapes[0].class_id)
+        painter.setPen(style.pen)
+        painter.setBrush(style.brush)
+        for shape in shapes:
+            self.draw_shape(painter, shape, style, batched=True)
+        
+        # Box labels are always shown
+        if style.label:
+            painter.setPen(self.style_cache.label_pen)
+            painter.setFont(self.style_cache.label_font)
+            for shape in shapes:
+                if get_shape_type(shape).labelled:
+                    x1, y1, x2, y2 = shape.get_bounds()
+                    self.draw_label(
+                        painter,
+                        int(x1 * self.scale + self.offset_x),
+                        int(y1 * self.scale + self.offset_y),
+                        style.label
+                    )
+        
+    def get_visible_shapes(self):
+        """Get the shapes intersecting the visible image area, in z-order"""
+        # Visible image rect, padded so labels of shapes just outside still show
+        margin = self.cull_margin / self.scale
+        x1 = -self.offset_x / self.scale - margin
+        y1 = -self.offset_y / self.scale - margin
+        x2 = (self.width() - self.offset_x) / self.scale + margin
+        y2 = (self.height() - self.offset_y) / self.scale + margin
+        
+        # Nothing to cull when the whole image is on screen
+        if x1 <= 0 and y1 <= 0 and x2 >= self.image_width and y2 >= self.image_height:
+            return self.shapes
+        
+        self.ensure_spatial_index()
+        visible = self.spatial_index.query(x1, y1, x2, y2)
+        visible.sort(key=lambda shape: self.shape_order[id(shape)])
+        return visible
+                
+    def draw_shape(self, painter, shape, style=None, batched=False):
+        """Draw a single shape in its class style
+        
+        When batched, the caller has already set the pen and brush and
+        draws the labels itself.
+        """
+        if style is None:
+            style = self.style_cache.get_style(getattr(shape, 'class_id', None), shape.selected)
+        
+        # Draw with the function registered for the shape type
+        get_shape_type(shape).draw(self, painter, shape, style, batched)
+            
+    def draw_label(self, painter, x, y, text):
+        """Draw a class label above the point (x, y) in widget coordinates"""
+        label = self.style_cache.get_label(text)
+        painter.fillRect(
+            x, y - label.background_height,
+            label.background_width, label.background_height,
+            self.style_cache.label_background
+        )
+        # Static text is positioned by its top-left corner, not its baseline
+        painter.drawStaticText(QPointF(x + 5, y - 8 - label.ascent), label.static_text)
+        
+    def draw_handles(self, painter, points):
+        """Draw resize handles at widget coordinates"""
+        painter.setBrush(self.style_cache.handle_brush)
+        painter.setPen(self.style_cache.handle_pen)
+        
+        half = self.handle_size // 2
+        for wx, wy in points:
+            painter.drawRect(int(wx - half), int(wy - half), self.handle_size, self.handle_size)
         
-    def draw_single_box(self, painter, box, color):
+    def draw_single_box(self, painter, box, style, batched=False):
         """Draw a single bounding box"""
         x1, y1, x2, y2 = box.to_pixels()
         
@@ -380,103 +780,58 @@ class AnnotationCanvas(QWidget):
         x2 = int(x2 * self.scale + self.offset_x)
         y2 = int(y2 * self.scale + self.offset_y)
         
-        # Set pen based on selection
-        if box.selected:
-            pen = QPen(QColor(255, 255, 0), 3)  # Yellow, thicker
-        else:
-            pen = QPen(color, 2)
-            
-        painter.setPen(pen)
-        painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 50)))
+        if not batched:
+            painter.setPen(style.pen)
+            painter.setBrush(style.box_brush)
         
         # Draw rectangle
-        rect = QRect(x1, y1, x2 - x1, y2 - y1)
-        painter.drawRect(rect)
+        painter.drawRect(QRect(x1, y1, x2 - x1, y2 - y1))
         
         # Draw resize handles for selected box
         if box.selected:
-            painter.setBrush(QBrush(QColor(255, 255, 255)))
-            painter.setPen(QPen(QColor(0, 0, 0), 1))
-            
-            # Draw corner handles
-            half = self.handle_size // 2
-            painter.drawRect(x1 - half, y1 - half, self.handle_size, self.handle_size)  # TL
-            painter.drawRect(x2 - half, y1 - half, self.handle_size, self.handle_size)  # TR
-            painter.drawRect(x1 - half, y2 - half, self.handle_size, self.handle_size)  # BL
-            painter.drawRect(x2 - half, y2 - half, self.handle_size, self.handle_size)  # BR
+            self.draw_handles(painter, [(x1, y1), (x2, y1), (x1, y2), (x2, y2)])
         
         # Draw class name if available
-        if self.class_manager and hasattr(box, 'class_id') and box.class_id:
-            cls = self.class_manager.get_class(box.class_id)
-            if cls:
-                painter.setPen(QPen(Qt.white, 1))
-                painter.setFont(QFont("Arial", 8))
-                
-                # Draw background for text
-                text = cls.name
-                text_width = painter.fontMetrics().horizontalAdvance(text)
-                text_height = painter.fontMetrics().height()
-                painter.fillRect(x1, y1 - text_height - 5, text_width + 10, text_height + 5, QColor(0, 0, 0, 150))
-                
-                painter.drawText(x1 + 5, y1 - 8, text)
+        if not batched and style.label:
+            painter.setPen(self.style_cache.label_pen)
+            painter.setFont(self.style_cache.label_font)
+            self.draw_label(painter, x1, y1, style.label)
     
-    def draw_polygon(self, painter, polygon, color):
+    def draw_polygon(self, painter, polygon, style, batched=False):
         """Draw a polygon shape with highlighting when selected"""
-        points = polygon.to_pixel_points()
+        # Below 1:1 zoom, draw unselected outlines simplified to half a screen pixel
+        if polygon.selected or self.scale >= self.lod_max_scale:
+            points = polygon.to_pixel_points()
+        else:
+            zoom_bucket = math.floor(math.log2(self.scale))
+            points = polygon.get_simplified_pixel_points(0.5 / 2 ** zoom_bucket)
         
         # Convert to widget coordinates
-        widget_points = []
+        poly = QPolygonF()
         for px, py in points:
-            wx = int(px * self.scale + self.offset_x)
-            wy = int(py * self.scale + self.offset_y)
-            widget_points.append(QPointF(wx, wy))
+            poly.append(QPointF(int(px * self.scale + self.offset_x), int(py * self.scale + self.offset_y)))
         
         # Set pen based on selection - YELLOW when selected
-        if polygon.selected:
-            pen = QPen(QColor(255, 255, 0), 3)  # Yellow, thicker for selected
-            # Add a glow effect
-            painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 80)))
-        else:
-            pen = QPen(color, 2)
-            painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 50)))
-        
-        painter.setPen(pen)
+        if not batched:
+            painter.setPen(style.pen)
+            painter.setBrush(style.brush)
         
         # Draw polygon
-        poly = QPolygonF()
-        for point in widget_points:
-            poly.append(point)
-        
         if len(poly) >= 3:
             painter.drawPolygon(poly)
             
             # Draw vertices for selected polygon
             if polygon.selected:
-                painter.setBrush(QBrush(QColor(255, 255, 255)))
-                painter.setPen(QPen(QColor(0, 0, 0), 1))
-                
-                half = self.handle_size // 2
-                for wx, wy in [(p.x(), p.y()) for p in widget_points]:
-                    painter.drawRect(int(wx - half), int(wy - half), self.handle_size, self.handle_size)
+                self.draw_handles(painter, [(p.x(), p.y()) for p in poly])
         
         # Draw class name if available
-        if polygon.selected and self.class_manager and hasattr(polygon, 'class_id') and polygon.class_id:
-            cls = self.class_manager.get_class(polygon.class_id)
-            if cls and widget_points:
-                # Use first point for text placement
-                wx, wy = widget_points[0].x(), widget_points[0].y()
-                painter.setPen(QPen(Qt.white, 1))
-                painter.setFont(QFont("Arial", 8))
-                
-                # Draw background for text
-                text = cls.name
-                text_width = painter.fontMetrics().horizontalAdvance(text)
-                text_height = painter.fontMetrics().height()
-                painter.fillRect(int(wx), int(wy) - text_height - 5, text_width + 10, text_height + 5, QColor(0, 0, 0, 150))
-                
-                painter.drawText(int(wx) + 5, int(wy) - 8, text)
+        if polygon.selected and style.label and len(poly):
+            # Use first point for text placement
+            painter.setPen(self.style_cache.label_pen)
+            painter.setFont(self.style_cache.label_font)
+            self.draw_label(painter, int(poly[0].x()), int(poly[0].y()), style.label)
     
-    def draw_circle(self, painter, circle, color):
+    def draw_circle(self, painter, circle, style, batched=False):
         """Draw a circle shape with highlighting when selected"""
         cx, cy, r = circle.to_pixels()
         
@@ -486,45 +841,27 @@ class AnnotationCanvas(QWidget):
         wr = int(r * self.scale)
         
         # Set pen based on selection - YELLOW when selected
-        if circle.selected:
-            pen = QPen(QColor(255, 255, 0), 3)  # Yellow, thicker
-            painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 80)))
-        else:
-            pen = QPen(color, 2)
-            painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 50)))
-        
-        painter.setPen(pen)
+        if not batched:
+            painter.setPen(style.pen)
+            painter.setBrush(style.brush)
         
         # Draw circle
         painter.drawEllipse(wx - wr, wy - wr, wr * 2, wr * 2)
         
         # Draw resize handles for selected circle
         if circle.selected:
-            painter.setBrush(QBrush(QColor(255, 255, 255)))
-            painter.setPen(QPen(QColor(0, 0, 0), 1))
-            
-            half = self.handle_size // 2
-            handles = circle.get_resize_handles()
-            for handle_name, (hx, hy) in handles.items():
-                whx = int(hx * self.scale + self.offset_x)
-                why = int(hy * self.scale + self.offset_y)
-                painter.drawRect(whx - half, why - half, self.handle_size, self.handle_size)
+            self.draw_handles(painter, [
+                (hx * self.scale + self.offset_x, hy * self.scale + self.offset_y)
+                for hx, hy in circle.get_resize_handles().values()
+            ])
         
         # Draw class name if available
-        if circle.selected and self.class_manager and hasattr(circle, 'class_id') and circle.class_id:
-            cls = self.class_manager.get_class(circle.class_id)
-            if cls:
-                painter.setPen(QPen(Qt.white, 1))
-                painter.setFont(QFont("Arial", 8))
-                
-                # Draw background for text
-                text = cls.name
-                text_width = painter.fontMetrics().horizontalAdvance(text)
-                text_height = painter.fontMetrics().height()
-                painter.fillRect(wx - wr, wy - wr - text_height - 5, text_width + 10, text_height + 5, QColor(0, 0, 0, 150))
-                
-                painter.drawText(wx - wr + 5, wy - wr - 8, text)
+        if circle.selected and style.label:
+            painter.setPen(self.style_cache.label_pen)
+            painter.setFont(self.style_cache.label_font)
+            self.draw_label(painter, wx - wr, wy - wr, style.label)
     
+
     def draw_polygon_preview(self, painter):
         """Draw polygon preview while drawing"""
         if len(self.polygon_points) < 1:
@@ -569,7 +906,7 @@ class AnnotationCanvas(QWidget):
         half = self.handle_size // 2
         painter.drawRect(wx - half, wy - half, self.handle_size, self.handle_size)
 
-    def draw_ellipse(self, painter, ellipse, color):
+    def draw_ellipse(self, painter, ellipse, style, batched=False):
         """Draw an ellipse shape with highlighting when selected"""
         cx, cy, rx, ry = ellipse.to_pixels()
         
@@ -580,47 +917,31 @@ class AnnotationCanvas(QWidget):
         wry = int(ry * self.scale)
         
         # Set pen based on selection - YELLOW when selected
-        if ellipse.selected:
-            pen = QPen(QColor(255, 255, 0), 3)  # Yellow, thicker
-            painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 80)))
-        else:
-            pen = QPen(color, 2)
-            painter.setBrush(QBrush(QColor(color.red(), color.green(), color.blue(), 50)))
-        
-        painter.setPen(pen)
+        if not batched:
+            painter.setPen(style.pen)
+            painter.setBrush(style.brush)
         
         # Draw ellipse
         painter.drawEllipse(wx - wrx, wy - wry, wrx * 2, wry * 2)
         
         # Draw resize handles for selected ellipse
         if ellipse.selected:
-            painter.setBrush(QBrush(QColor(255, 255, 255)))
-            painter.setPen(QPen(QColor(0, 0, 0), 1))
-            
-            half = self.handle_size // 2
-            handles = ellipse.get_resize_handles()
-            for handle_name, (hx, hy) in handles.items():
-                whx = int(hx * self.scale + self.offset_x)
-                why = int(hy * self.scale + self.offset_y)
-                painter.drawRect(whx - half, why - half, self.handle_size, self.handle_size)
+            self.draw_handles(painter, [
+                (hx * self.scale + self.offset_x, hy * self.scale + self.offset_y)
+                for hx, hy in ellipse.get_resize_handles().values()
+            ])
         
         # Draw class name if available
-        if ellipse.selected and self.class_manager and hasattr(ellipse, 'class_id') and ellipse.class_id:
-            cls = self.class_manager.get_class(ellipse.class_id)
-            if cls:
-                painter.setPen(QPen(Qt.white, 1))
-                painter.setFont(QFont("Arial", 8))
-                
-                # Draw background for text
-                text = cls.name
-                text_width = painter.fontMetrics().horizontalAdvance(text)
-                text_height = painter.fontMetrics().height()
-                painter.fillRect(wx - wrx, wy - wry - text_height - 5, text_width + 10, text_height + 5, QColor(0, 0, 0, 150))
-                
-                painter.drawText(wx - wrx + 5, wy - wry - 8, text)    
+        if ellipse.selected and style.label:
+            painter.setPen(self.style_cache.label_pen)
+            painter.setFont(self.style_cache.label_font)
+            self.draw_label(painter, wx - wrx, wy - wry, style.label)
         
+
     def mousePressEvent(self, event):
         """Handle mouse press events"""
+        self.flush_pending_move()
+        
         if event.button() == Qt.MiddleButton or (event.button() == Qt.LeftButton and self.pan_mode):
             # Pan mode
             self.dragging = True
@@ -628,7 +949,7 @@ class AnnotationCanvas(QWidget):
             self.setCursor(Qt.ClosedHandCursor)
             
         elif event.button() == Qt.LeftButton and not self.pan_mode:
-            if self.pixmap and not self.pixmap.isNull():
+            if self.has_image():
                 
                 # Check if we have a selected class
                 current_class = self.class_manager.get_current_class() if self.class_manager else None
@@ -636,19 +957,21 @@ class AnnotationCanvas(QWidget):
                 # Check if Ctrl is pressed for drag-copy
                 modifiers = QApplication.keyboardModifiers()
                 ctrl_pressed = modifiers == Qt.ControlModifier
+                shift_pressed = modifiers == Qt.ShiftModifier
                 
                 # FIRST: Check if we're over a resize handle of selected shape
                 if self.selected_shape:
                     handle = self.get_resize_handle_at_pos(event.pos(), self.selected_shape)
                     print(f"🔍 Handle detection: {handle}")  # DEBUG
                     
-                    if handle:
+                    if handle is not None:
                         print(f"🎯 Handle '{handle}' detected on {getattr(self.selected_shape, 'type', 'shape')}")  # DEBUG
                         
                         # Start resizing
                         self.resizing = True
                         self.resizing_handle = handle
                         self.resize_start_pos = self.widget_to_image(event.pos())
+                        self.resize_original_geometry = self.get_resize_geometry(self.selected_shape, handle)
                         
                         # Call begin_resize on the shape
                         if hasattr(self.selected_shape, 'begin_resize'):
@@ -662,11 +985,7 @@ class AnnotationCanvas(QWidget):
                 
                 # SECOND: Check if we're clicking on a shape (for moving or selecting)
                 image_x, image_y = self.widget_to_image(event.pos())
-                clicked_shape = None
-                for shape in reversed(self.shapes):
-                    if hasattr(shape, 'contains_point') and shape.contains_point(image_x, image_y):
-                        clicked_shape = shape
-                        break
+                clicked_shape = self.find_shape_at(image_x, image_y)
                 
                 if clicked_shape:
                     # If Ctrl is pressed, start drag-copy
@@ -674,6 +993,11 @@ class AnnotationCanvas(QWidget):
                         self.start_drag_copy(clicked_shape, event.pos())
                         return
                     
+                    # Shift-click adds or removes the shape from the selection
+                    if shift_pressed:
+                        self.toggle_selection(clicked_shape)
+                        return
+                    
                     # If the clicked shape is already selected, start moving it
                     if clicked_shape.selected:
                         self.start_move(clicked_shape, event.pos())
@@ -683,81 +1007,123 @@ class AnnotationCanvas(QWidget):
                         self.select_shape(event.pos())
                         return
                 
-                # If no shape was clicked and we have a drawing tool selected, start drawing
-                if self.current_shape_type and self.current_shape_type != 'none':
-                    # Handle shape-specific drawing
-                    if self.current_shape_type == 'polygon':
-                        self.start_polygon_drawing(event.pos())
-                    elif self.current_shape_type == 'circle':
-                        self.start_circle_drawing(event.pos())
-                    elif self.current_shape_type == 'ellipse':
-                        self.start_ellipse_drawing(event.pos())
-                    elif self.current_shape_type == 'box':
-                        self.start_drawing(event.pos())
-                else:
-                    # No tool selected, just click on empty area (deselect)
-                    self.select_shape(event.pos())  # This will deselect
+                # Shift-drag on empty space, or any drag without a drawing tool, selects by rectangle
+                if shift_pressed or not self.current_shape_type or self.current_shape_type == 'none':
+                    self.start_rubber_band(event.pos(), additive=shift_pressed)
+                    return
+                
+                # Otherwise start drawing with the selected tool
+                if self.current_shape_type == 'polygon':
+                    self.start_polygon_drawing(event.pos())
+                elif self.current_shape_type == 'circle':
+                    self.start_circle_drawing(event.pos())
+                elif self.current_shape_type == 'ellipse':
+                    self.start_ellipse_drawing(event.pos())
+                elif self.current_shape_type == 'box':
+                    self.start_drawing(event.pos())
 
     def mouseMoveEvent(self, event):
-        """Handle mouse move events"""
+        """Handle mouse move events, coalesced to one pass per display frame"""
+        if self.frame_timer.isActive():
+            # Already handled a move this frame - keep only the latest one
+            if self.pending_move is not None:
+                self.dropped_move_events += 1
+            self.pending_move = (QPoint(event.pos()), event.buttons())
+            return
+        
+        self.handle_mouse_move(event.pos(), event.buttons())
+        self.frame_timer.start()
+        
+    def on_frame_timer(self):
+        """Process the latest mouse move held back during the last frame"""
+        if self.pending_move is not None:
+            self.flush_pending_move()
+            self.frame_timer.start()
+            
+    def flush_pending_move(self):
+        """Handle a held-back mouse move right away"""
+        if self.pending_move is not None:
+            pos, buttons = self.pending_move
+            self.pending_move = None
+            self.handle_mouse_move(pos, buttons)
+        
+    def handle_mouse_move(self, pos, buttons):
+        """Apply a mouse move to the current interaction"""
         # Convert widget coordinates to image coordinates
-        image_x, image_y = self.widget_to_image(event.pos())
+        image_x, image_y = self.widget_to_image(pos)
         
         # Emit position signal
         self.position_changed.emit(image_x, image_y)
         
+        # Use fast filtering while anything is being dragged
+        if buttons != Qt.NoButton:
+            self.mark_interacting()
+            self.set_hover(None, None)
+        else:
+            self.update_hover(pos)
+        
         # Handle dragging for panning
         if self.dragging and self.last_mouse_pos:
-            delta = event.pos() - self.last_mouse_pos
+            delta = pos - self.last_mouse_pos
             self.offset_x += delta.x()
             self.offset_y += delta.y()
-            self.last_mouse_pos = event.pos()
+            self.last_mouse_pos = pos
             self.update()
             
+        # Handle rectangle selection
+        elif self.rubber_band_origin is not None:
+            self.update_rubber_band(pos)
+        
         # Handle moving shapes
         elif self.moving and not self.resizing:
-            self.update_move(event.pos())
+            self.update_move(pos)
         
         # Handle drawing
         elif self.drawing:
-            self.update_drawing(event.pos())
+            self.update_drawing(pos)
         
         # Handle drag-copy
         elif self.drag_copy and not self.resizing:
-            self.update_drag_copy(event.pos())
+            self.update_drag_copy(pos)
         
         # Handle circle drawing
         elif self.current_shape_type == 'circle' and self.circle_center:
-            self.update_circle_drawing(event.pos())
+            self.update_circle_drawing(pos)
         
         # Handle ellipse drawing
         elif self.current_shape_type == 'ellipse' and hasattr(self, 'ellipse_center') and self.ellipse_center:
-            self.update_ellipse_drawing(event.pos())
+            self.update_ellipse_drawing(pos)
         
         # Handle resizing
-        elif self.resizing and self.resizing_handle and self.selected_shape:
+        elif self.resizing and self.resizing_handle is not None and self.selected_shape:
             print(f"🔄 Resizing with handle {self.resizing_handle}")  # DEBUG
             
-            current_pos = self.widget_to_image(event.pos())
+            current_pos = self.widget_to_image(pos)
             dx = current_pos[0] - self.resize_start_pos[0]
             dy = current_pos[1] - self.resize_start_pos[1]
             
             print(f"📐 Delta: ({dx}, {dy})")  # DEBUG
             
+            old_rect = self.shape_widget_rect(self.selected_shape)
             if hasattr(self.selected_shape, 'resize_from_handle'):
                 result = self.selected_shape.resize_from_handle(self.resizing_handle, dx, dy)
                 print(f"📊 resize_from_handle returned: {result}")  # DEBUG
             
-            self.update()
+            self.update_shape_area(old_rect, self.selected_shape)
     
     def mouseReleaseEvent(self, event):
         """Handle mouse release events"""
+        # Apply the final position before ending the interaction
+        self.flush_pending_move()
+        
         if event.button() == Qt.MiddleButton or (event.button() == Qt.LeftButton and self.dragging):
             self.dragging = False
             self.setCursor(Qt.OpenHandCursor if self.pan_mode else Qt.ArrowCursor)
             
         elif event.button() == Qt.LeftButton:
-            if self.moving:
+            if self.rubber_band_origin is not None:
+                self.finish_rubber_band()
+            elif self.moving:
                 self.finish_move()
             elif self.drawing:
                 self.finish_drawing()
@@ -769,6 +1135,7 @@ class AnnotationCanvas(QWidget):
                 self.finish_ellipse()
             elif self.resizing:
                 # Finished resizing
+                handle = self.resizing_handle
                 self.resizing = False
                 self.resizing_handle = None
                 self.resize_start_pos = None
@@ -777,6 +1144,18 @@ class AnnotationCanvas(QWidget):
                 if self.selected_shape and hasattr(self.selected_shape, '_resize_origin'):
                     self.selected_shape._resize_origin = None
                     print("✅ Resizing complete - origin cleared")
+                if self.selected_shape:
+                    self.shape_geometry_changed(self.selected_shape)
+                    if self.resize_original_geometry is not None:
+                        geometry = self.get_resize_geometry(self.selected_shape, handle)
+                        if geometry != self.resize_original_geometry:
+                            if get_shape_type(self.selected_shape).vertex_handles:
+                                command = MoveVertex(self.selected_shape, handle, self.resize_original_geometry, geometry)
+                            else:
+                                command = ResizeShape(self.selected_shape, self.resize_original_geometry, geometry)
+                            self.push_command(command)
+                self.resize_original_geometry = None
+                self.update()
             
             # Ensure we're not stuck in any special state
             self.drag_copy = False
@@ -784,7 +1163,7 @@ class AnnotationCanvas(QWidget):
                 
     def wheelEvent(self, event):
         """Handle mouse wheel for zooming - zooms to cursor position"""
-        if not self.pixmap or self.pixmap.isNull():
+        if not self.has_image():
             return
         
         # Get cursor position in widget coordinates
@@ -814,6 +1193,7 @@ class AnnotationCanvas(QWidget):
             self.offset_x = image_x - image_pos[0] * self.scale
             self.offset_y = image_y - image_pos[1] * self.scale
             
+            self.mark_interacting()
             self.update()
             
     def keyPressEvent(self, event):
@@ -835,6 +1215,10 @@ class AnnotationCanvas(QWidget):
                 self.pan_mode = False
                 self.setCursor(self.original_cursor or Qt.ArrowCursor)
                 print("🖐️ Pan mode deactivated")
+            elif self.rubber_band_origin is not None:
+                self.cancel_rubber_band()
+            elif self.pasting:
+                self.cancel_paste()
             elif self.moving:
                 self.cancel_move()
             elif self.drag_copy:
@@ -855,12 +1239,22 @@ class AnnotationCanvas(QWidget):
         elif event.key() == Qt.Key_Return or event.key() == Qt.Key_Enter:
             if self.polygon_points:
                 self.finish_polygon()
+            elif self.pasting:
+                self.confirm_paste()
         
         # Delete key
         elif event.key() == Qt.Key_Delete or event.key() == Qt.Key_Backspace:
             if not self.drag_copy and not self.pan_mode and not self.moving:
                 self.delete_selected()
         
+        # Arrow keys nudge the selection by one pixel, ten with Shift
+        elif event.key() in (Qt.Key_Left, Qt.Key_Right, Qt.Key_Up, Qt.Key_Down):
+            if not self.drag_copy and not self.pan_mode and not self.moving and not self.resizing:
+                step = 10 if event.modifiers() & Qt.ShiftModifier else 1
+                dx = {Qt.Key_Left: -step, Qt.Key_Right: step}.get(event.key(), 0)
+                dy = {Qt.Key_Up: -step, Qt.Key_Down: step}.get(event.key(), 0)
+                self.nudge_selection(dx, dy)
+        
         # Undo: Ctrl+Z
         elif event.key() == Qt.Key_Z and event.modifiers() == Qt.ControlModifier:
             self.undo()
@@ -875,7 +1269,7 @@ class AnnotationCanvas(QWidget):
         
         # Paste: Ctrl+V
         elif event.key() == Qt.Key_V and event.modifiers() == Qt.ControlModifier:
-            if self.clipboard_shape and self.pixmap and not self.pixmap.isNull():
+            if self.clipboard_shapes and self.has_image():
                 # Get current mouse position
                 cursor_pos = self.mapFromGlobal(self.cursor().pos())
                 self.start_paste(cursor_pos)
@@ -889,7 +1283,7 @@ class AnnotationCanvas(QWidget):
         self.drag_copy = False
         self.resizing = False
         self.resizing_handle = None
-        self.drag_copy_shape = None
+        self.drag_copy_shapes = []
         self.current_shape = None
         self.start_point = None
         self.pasting = False
@@ -905,7 +1299,7 @@ class AnnotationCanvas(QWidget):
         
     def widget_to_image(self, pos):
         """Convert widget coordinates to image coordinates"""
-        if not self.pixmap or self.pixmap.isNull():
+        if not self.has_image():
             return 0, 0
             
         # Calculate image position
@@ -920,148 +1314,138 @@ class AnnotationCanvas(QWidget):
         
     def resizeEvent(self, event):
         """Handle resize events"""
-        if self.pixmap and not self.pixmap.isNull():
+        if self.has_image():
             self.fit_to_window()
         super().resizeEvent(event)
+        
+    def leaveEvent(self, event):
+        """Drop the hover highlight when the cursor leaves the canvas"""
+        self.set_hover(None, None)
+        super().leaveEvent(event)
 
     def start_move(self, shape, pos):
-        """Start moving a selected shape"""
+        """Start moving the selection, grabbed at one of its shapes"""
         if not shape or not shape.selected:
             return False
         
-        print(f"↔️ Starting move operation")
+        print(f"↔️ Starting move of {len(self.selected_shapes)} shape(s)")
         self.moving = True
         self.selected_shape = shape
         self.move_start_pos = self.widget_to_image(pos)
         
-        # Store original position for undo (based on shape type)
-        if hasattr(shape, 'x') and hasattr(shape, 'y'):  # Box
-            self.move_original_positions = [(shape.x, shape.y)]
-        elif hasattr(shape, 'center_x') and hasattr(shape, 'center_y'):  # Circle
-            self.move_original_positions = [(shape.center_x, shape.center_y)]
-        elif hasattr(shape, 'points'):  # Polygon
-            self.move_original_positions = shape.points.copy()
+        # Track the distance moved for cancel and undo
+        self.move_offset = (0.0, 0.0)
         
         self.setCursor(Qt.ClosedHandCursor)
         return True
     
     def update_move(self, pos):
-        """Update shape position while moving"""
-        if not self.moving or not self.selected_shape:
+        """Update the selection position while moving"""
+        if not self.moving or not self.selected_shapes:
             return
         
         current_pos = self.widget_to_image(pos)
         dx = (current_pos[0] - self.move_start_pos[0]) / self.image_width
         dy = (current_pos[1] - self.move_start_pos[1]) / self.image_height
+        old_rect = self.shapes_widget_rect(self.selected_shapes)
         
-        # Move shape based on type
-        if hasattr(self.selected_shape, 'x') and hasattr(self.selected_shape, 'y'):  # Box
-            self.selected_shape.x += dx
-            self.selected_shape.y += dy
-        elif hasattr(self.selected_shape, 'center_x') and hasattr(self.selected_shape, 'center_y'):  # Circle
-            self.selected_shape.center_x += dx
-            self.selected_shape.center_y += dy
-        elif hasattr(self.selected_shape, 'points'):  # Polygon
-            new_points = []
-            for nx, ny in self.selected_shape.points:
-                new_points.append((nx + dx, ny + dy))
-            self.selected_shape.points = new_points
+        for shape in self.selected_shapes:
+            shape.move(dx, dy)
         
+        self.move_offset = (self.move_offset[0] + dx, self.move_offset[1] + dy)
         self.move_start_pos = current_pos
-        self.update()
+        self.update(old_rect.united(self.shapes_widget_rect(self.selected_shapes)))
     
     def finish_move(self):
-        """Finish moving shape"""
-        if self.moving and self.selected_shape:
-            self.save_state()  # Save state for undo
-            print("✅ Move completed")
+        """Finish moving the selection as one undo step"""
+        if self.moving and self.selected_shapes:
+            if self.move_offset != (0.0, 0.0):
+                for shape in self.selected_shapes:
+                    self.shape_geometry_changed(shape)
+                self.push_command(MoveShapes(self.selected_shapes, *self.move_offset))
+                print("✅ Move completed")
         
         self.moving = False
         self.move_start_pos = None
-        self.move_original_positions = []
+        self.move_offset = (0.0, 0.0)
         self.setCursor(Qt.ArrowCursor)
         self.update()
     
     def cancel_move(self):
-        """Cancel move operation and restore original position"""
-        if self.moving and self.selected_shape and self.move_original_positions:
-            # Restore original position based on shape type
-            if hasattr(self.selected_shape, 'x') and hasattr(self.selected_shape, 'y'):  # Box
-                self.selected_shape.x, self.selected_shape.y = self.move_original_positions[0]
-            elif hasattr(self.selected_shape, 'center_x') and hasattr(self.selected_shape, 'center_y'):  # Circle
-                self.selected_shape.center_x, self.selected_shape.center_y = self.move_original_positions[0]
-            elif hasattr(self.selected_shape, 'points'):  # Polygon
-                self.selected_shape.points = self.move_original_positions.copy()
-            
+        """Cancel move operation and restore original positions"""
+        if self.moving and self.move_offset != (0.0, 0.0):
+            dx, dy = self.move_offset
+            for shape in self.selected_shapes:
+                shape.move(-dx, -dy)
+                self.shape_geometry_changed(shape)
             print("❌ Move cancelled")
         
         self.moving = False
         self.move_start_pos = None
-        self.move_original_positions = []
+        self.move_offset = (0.0, 0.0)
         self.setCursor(Qt.ArrowCursor)
         self.update()
 
+    def nudge_selection(self, dx, dy):
+        """Move the selection by whole image pixels; quick repeated nudges are one undo step"""
+        if not self.selected_shapes or not self.has_image():
+            return False
+        
+        dx /= self.image_width
+        dy /= self.image_height
+        old_rect = self.shapes_widget_rect(self.selected_shapes)
+        for shape in self.selected_shapes:
+            shape.move(dx, dy)
+            self.shape_geometry_changed(shape)
+        self.push_command(MoveShapes(self.selected_shapes, dx, dy), coalesce=True)
+        self.update(old_rect.united(self.shapes_widget_rect(self.selected_shapes)))
+        return True
+
     def copy_selected(self):
-        """Copy the selected shape to clipboard"""
-        if self.selected_shape and hasattr(self.selected_shape, 'copy'):
-            self.clipboard_shape = self.selected_shape.copy()
-            shape_type = getattr(self.selected_shape, 'type', 'box')
-            print(f"📋 Copied {shape_type}")
+        """Copy the selected shapes to clipboard, in z-order"""
+        if self.selected_shapes:
+            self.ensure_spatial_index()
+            ordered = sorted(self.selected_shapes, key=lambda shape: self.shape_order.get(id(shape), 0))
+            self.clipboard_shapes = [shape.copy() for shape in ordered]
+            print(f"📋 Copied {len(self.clipboard_shapes)} shape(s)")
             return True
         else:
-            print("⚠️ No shape selected to copy or copy not supported")
+            print("⚠️ No shape selected to copy")
             return False    
     
     def start_paste(self, pos):
-        """Start pasting a shape at cursor position"""
-        if not self.clipboard_shape:
+        """Paste the clipboard shapes centered at the cursor position"""
+        if not self.clipboard_shapes:
             print("⚠️ No shape in clipboard to paste")
             return False
         
         print(f"📋 Pasting at cursor position: ({pos.x()}, {pos.y()})")
         
-        # Create a copy of the clipboard shape
-        self.paste_shape = self.clipboard_shape.copy()
+        # Create copies of the clipboard shapes
+        self.paste_shapes = [shape.copy() for shape in self.clipboard_shapes]
         self.pasting = True
         self.paste_confirmed = False
         
-        # Position the shape exactly at cursor position
+        # Put a lone shape's paste anchor, or the group's bounding rect center, on the cursor
         image_x, image_y = self.widget_to_image(pos)
-        
-        # Update position based on shape type
-        if hasattr(self.paste_shape, 'x') and hasattr(self.paste_shape, 'y'):
-            # For boxes - center at cursor
-            self.paste_shape.x = image_x / self.image_width
-            self.paste_shape.y = image_y / self.image_height
-        elif hasattr(self.paste_shape, 'center_x') and hasattr(self.paste_shape, 'center_y'):
-            # For circles - center at cursor
-            self.paste_shape.center_x = image_x / self.image_width
-            self.paste_shape.center_y = image_y / self.image_height
-        elif hasattr(self.paste_shape, 'points'):
-            # For polygons - center at cursor
-            if self.paste_shape.points:
-                # Calculate center offset
-                points = self.paste_shape.points
-                center_x = sum(p[0] for p in points) / len(points)
-                center_y = sum(p[1] for p in points) / len(points)
-                dx = (image_x / self.image_width) - center_x
-                dy = (image_y / self.image_height) - center_y
-                self.paste_shape.move(dx, dy)
-
-        # Deselect any selected shape
-        if self.selected_shape:
-            self.selected_shape.selected = False
-            self.selected_shape = None
-
-        # Select the paste shape
-        self.paste_shape.selected = True
-        self.selected_shape = self.paste_shape
-
-        # Add to shapes list
-        self.shapes.append(self.paste_shape)
-        
-        shape_type = getattr(self.paste_shape, 'type', 'box')
-        print(f"📋 Pasting {shape_type} - drag to position, Enter to confirm, Esc to cancel")
+        if len(self.paste_shapes) == 1:
+            shape = self.paste_shapes[0]
+            anchor_x, anchor_y = get_shape_type(shape).paste_anchor(shape)
+        else:
+            x1, y1, x2, y2 = self.shapes_bounds(self.paste_shapes)
+            anchor_x, anchor_y = (x1 + x2) / 2, (y1 + y2) / 2
+        dx = (image_x - anchor_x) / self.image_width
+        dy = (image_y - anchor_y) / self.image_height
+        for shape in self.paste_shapes:
+            shape.move(dx, dy)
+        
+        # Add to shapes list as one undo step and select the pasted shapes
+        self.add_shapes(self.paste_shapes)
+        self.paste_command = AddShapes(self.paste_shapes)
+        self.push_command(self.paste_command)
+        self.set_selection(self.paste_shapes)
+        
+        print(f"📋 Pasting {len(self.paste_shapes)} shape(s) - drag to position, Enter to confirm, Esc to cancel")
         self.update()
         return True
 
@@ -1097,10 +1481,11 @@ class AnnotationCanvas(QWidget):
                 self.update()              
 
     def confirm_paste(self):
-        """Confirm the paste and add the shape to the list"""
-        if self.pasting and self.paste_shape:
+        """Confirm the paste and keep the pasted shapes"""
+        if self.pasting and self.paste_shapes:
             print("✅ Paste confirmed")
             self.pasting = False
+            self.paste_command = None
             self.resizing_handle = None
             self.paste_start_pos = None
             self.paste_confirmed = True
@@ -1112,13 +1497,24 @@ class AnnotationCanvas(QWidget):
         """Cancel the paste operation"""
         if self.pasting:
             print("❌ Paste cancelled")
-            if self.paste_shape in self.shapes:
-                self.shapes.remove(self.paste_shape)
+            # Pasted shapes an undo already took away need no removing
+            current = {id(shape) for shape in self.shapes}
+            pasted = [shape for shape in self.paste_shapes if id(shape) in current]
+            if pasted:
+                if self.history.discard(self.paste_command):
+                    self.remove_shapes(pasted)
+                    self.history_changed.emit(self.histories.size_bytes)
+                else:
+                    # Edits recorded after the paste may involve its shapes, so undo must bring them back
+                    command = RemoveShapes(pasted, self.shapes)
+                    self.remove_shapes(pasted)
+                    self.push_command(command)
             self.pasting = False
-            self.paste_shape = None
+            self.paste_shapes = []
+            self.paste_command = None
             self.resizing_handle = None
             self.paste_start_pos = None
-            self.selected_shape = None
+            self.set_selection([])
             self.update()
             return True
         return False         
@@ -1128,79 +1524,85 @@ class AnnotationCanvas(QWidget):
         if not shape or not shape.selected:
             return None
         
-        if hasattr(shape, 'get_resize_handles'):
-            handles = shape.get_resize_handles()
-            
-            # Convert handle positions to widget coordinates
-            half = self.handle_size // 2
-            px, py = pos.x(), pos.y()
-            
-            for handle_name, (hx, hy) in handles.items():
+        half = self.handle_size // 2
+        px, py = pos.x(), pos.y()
+        
+        # Vertex handles: only test the vertices near the cursor, nearest first
+        if get_shape_type(shape).vertex_handles:
+            image_x = (px - self.offset_x) / self.scale
+            image_y = (py - self.offset_y) / self.scale
+            radius = (half + 1) / self.scale
+            pixel_points = shape.to_pixel_points()
+            for index in shape.get_vertex_grid().query(image_x, image_y, radius):
+                hx, hy = pixel_points[index]
                 wx = int(hx * self.scale + self.offset_x)
                 wy = int(hy * self.scale + self.offset_y)
-                
                 if (wx - half <= px <= wx + half) and (wy - half <= py <= wy + half):
-                    return handle_name
+                    return index
+            return None
+        
+        # Convert handle positions to widget coordinates
+        for handle_name, (hx, hy) in shape.get_resize_handles().items():
+            wx = int(hx * self.scale + self.offset_x)
+            wy = int(hy * self.scale + self.offset_y)
+            
+            if (wx - half <= px <= wx + half) and (wy - half <= py <= wy + half):
+                return handle_name
         
         return None
     
+    def get_resize_geometry(self, shape, handle):
+        """Get what a resize from a handle changes: the dragged vertex, or the whole geometry"""
+        if get_shape_type(shape).vertex_handles:
+            return tuple(shape.points[handle].tolist())
+        return get_shape_type(shape).get_geometry(shape)
+    
     def start_drag_copy(self, shape, pos):
-        """Start dragging a copy of the selected shape"""
+        """Start dragging a copy of a shape, or of the whole selection when it is selected"""
         if not shape or not hasattr(shape, 'copy'):
             return False
         
-        print(f"📋 Starting drag copy")
+        originals = list(self.selected_shapes) if shape.selected else [shape]
+        print(f"📋 Starting drag copy of {len(originals)} shape(s)")
         
-        # Create a copy
-        self.drag_copy_shape = shape.copy()
+        # Create the copies
+        self.drag_copy_shapes = [original.copy() for original in originals]
         self.drag_copy = True
-        self.original_shape = shape
+        self.original_shapes = originals
         self.drag_start_pos = self.widget_to_image(pos)
         
-        # Store original shape selection state
-        shape.selected = False
-        
-        # Add the copy to shapes list immediately
-        self.shapes.append(self.drag_copy_shape)
-        self.drag_copy_shape.selected = True
-        self.selected_shape = self.drag_copy_shape
+        # Add the copies to shapes list immediately and select them
+        self.add_shapes(self.drag_copy_shapes)
+        self.set_selection(self.drag_copy_shapes)
         
         self.update()
         return True
 
     def update_drag_copy(self, pos):
-        """Update position of dragged copy"""
-        if self.drag_copy and self.drag_copy_shape:
+        """Update position of dragged copies"""
+        if self.drag_copy and self.drag_copy_shapes:
             image_x, image_y = self.widget_to_image(pos)
+            dx = (image_x - self.drag_start_pos[0]) / self.image_width
+            dy = (image_y - self.drag_start_pos[1]) / self.image_height
+            old_rect = self.shapes_widget_rect(self.drag_copy_shapes)
             
-            # Update position based on shape type
-            if hasattr(self.drag_copy_shape, 'x') and hasattr(self.drag_copy_shape, 'y'):
-                # For boxes
-                self.drag_copy_shape.x = image_x / self.image_width
-                self.drag_copy_shape.y = image_y / self.image_height
-            elif hasattr(self.drag_copy_shape, 'center_x') and hasattr(self.drag_copy_shape, 'center_y'):
-                # For circles
-                self.drag_copy_shape.center_x = image_x / self.image_width
-                self.drag_copy_shape.center_y = image_y / self.image_height
-            elif hasattr(self.drag_copy_shape, 'points'):
-                # For polygons - move all points
-                if self.drag_start_pos:
-                    dx = (image_x - self.drag_start_pos[0]) / self.image_width
-                    dy = (image_y - self.drag_start_pos[1]) / self.image_height
-                    self.drag_copy_shape.move(dx, dy)
-                    self.drag_start_pos = (image_x, image_y)
+            for copy in self.drag_copy_shapes:
+                copy.move(dx, dy)
+            self.drag_start_pos = (image_x, image_y)
             
-            self.update()
+            self.update(old_rect.united(self.shapes_widget_rect(self.drag_copy_shapes)))
 
     def finish_drag_copy(self):
-        """Finish dragging copy"""
-        if self.drag_copy and self.drag_copy_shape:
-            self.save_state()  # Save state for the new copy
-            print("✅ Drag copy completed")
+        """Finish dragging copies as one undo step"""
+        if self.drag_copy and self.drag_copy_shapes:
+            for copy in self.drag_copy_shapes:
+                self.shape_geometry_changed(copy)
+            self.push_command(AddShapes(self.drag_copy_shapes))
+            print(f"✅ Drag copy of {len(self.drag_copy_shapes)} shape(s) completed")
             self.drag_copy = False
-            self.drag_copy_shape = None
+            self.drag_copy_shapes = []
             self.drag_start_pos = None
-            self.original_shape = None
+            self.original_shapes = []
             self.resizing = False
             self.update()
             return True
@@ -1208,25 +1610,20 @@ class AnnotationCanvas(QWidget):
 
     def cancel_drag_copy(self):
         """Cancel drag copy"""
-        if self.drag_copy and self.drag_copy_shape:
+        if self.drag_copy and self.drag_copy_shapes:
             print("❌ Drag copy cancelled")
             
-            # Remove the temporary drag copy shape from shapes list
-            if self.drag_copy_shape in self.shapes:
-                self.shapes.remove(self.drag_copy_shape)
+            # Remove the temporary copies from shapes list
+            self.remove_shapes(self.drag_copy_shapes)
             
-            # Restore original shape selection
-            if self.original_shape:
-                self.original_shape.selected = True
-                self.selected_shape = self.original_shape
-            else:
-                self.selected_shape = None
+            # Restore the original selection
+            self.set_selection(self.original_shapes)
             
             # Clear all drag-copy related states
             self.drag_copy = False
-            self.drag_copy_shape = None
+            self.drag_copy_shapes = []
             self.drag_start_pos = None
-            self.original_shape = None
+            self.original_shapes = []
             
             # Reset all interaction states
             self.resizing = False
@@ -1249,11 +1646,12 @@ class AnnotationCanvas(QWidget):
         print("🔄 Force resetting all states for drawing")
         self.drawing = False
         self.drag_copy = False
-        self.drag_copy_shape = None
+        self.drag_copy_shapes = []
         self.resizing = False
         self.resizing_handle = None
         self.pasting = False
-        self.paste_shape = None
+        self.paste_shapes = []
+        self.paste_command = None
         # Don't clear selected_shape here - let that be handled by click on empty area 
 
     def set_shape_type(self, shape_type):
@@ -1308,8 +1706,8 @@ class AnnotationCanvas(QWidget):
             )
             polygon.from_pixel_points(self.polygon_points)
             polygon.close_polygon()
-            self.save_state()  # Save state before adding
-            self.shapes.append(polygon)
+            self.add_shape(polygon)
+            self.push_command(AddShapes([polygon]))
             print(f"✅ Polygon completed with {len(self.polygon_points)} points")
         
         # Reset polygon drawing state
@@ -1333,10 +1731,13 @@ class AnnotationCanvas(QWidget):
         """Update circle while drawing"""
         if self.circle_center:
             current_pos = self.widget_to_image(pos)
-            dx = current_pos[0] - self.circle_center[0]
-            dy = current_pos[1] - self.circle_center[1]
+            cx, cy = self.circle_center
+            old_rect = self.preview_widget_rect(cx, cy, self.circle_radius, self.circle_radius)
+            dx = current_pos[0] - cx
+            dy = current_pos[1] - cy
             self.circle_radius = int(math.sqrt(dx*dx + dy*dy))
-            self.update()
+            new_rect = self.preview_widget_rect(cx, cy, self.circle_radius, self.circle_radius)
+            self.update(old_rect.united(new_rect))
             
     def finish_circle(self):
         """Finish drawing circle"""
@@ -1351,8 +1752,8 @@ class AnnotationCanvas(QWidget):
                 self.circle_center[1],
                 self.circle_radius
             )
-            self.save_state()  # Save state before adding
-            self.shapes.append(circle)
+            self.add_shape(circle)
+            self.push_command(AddShapes([circle]))
             print(f"✅ Circle completed with radius {self.circle_radius}")
         
         # Reset circle drawing state
@@ -1379,11 +1780,14 @@ class AnnotationCanvas(QWidget):
         """Update ellipse while drawing"""
         if hasattr(self, 'ellipse_center') and self.ellipse_center:
             current_pos = self.widget_to_image(pos)
-            dx = current_pos[0] - self.ellipse_center[0]
-            dy = current_pos[1] - self.ellipse_center[1]
+            cx, cy = self.ellipse_center
+            old_rect = self.preview_widget_rect(cx, cy, self.ellipse_radius_x, self.ellipse_radius_y)
+            dx = current_pos[0] - cx
+            dy = current_pos[1] - cy
             self.ellipse_radius_x = abs(dx)
             self.ellipse_radius_y = abs(dy)
-            self.update()
+            new_rect = self.preview_widget_rect(cx, cy, self.ellipse_radius_x, self.ellipse_radius_y)
+            self.update(old_rect.united(new_rect))
 
     def finish_ellipse(self):
         """Finish drawing ellipse"""
@@ -1399,8 +1803,8 @@ class AnnotationCanvas(QWidget):
                 self.ellipse_radius_x,
                 self.ellipse_radius_y
             )
-            self.save_state()  # Save state before adding
-            self.shapes.append(ellipse)
+            self.add_shape(ellipse)
+            self.push_command(AddShapes([ellipse]))
             print(f"✅ Ellipse completed with radii ({self.ellipse_radius_x}, {self.ellipse_radius_y})")
         
         # Reset ellipse drawing state
@@ -1438,59 +1842,280 @@ class AnnotationCanvas(QWidget):
         half = self.handle_size // 2
         painter.drawRect(wx - half, wy - half, self.handle_size, self.handle_size)    
 
+    # ===== RUBBER BAND SELECTION AND HOVER =====
+    def start_rubber_band(self, pos, additive=False):
+        """Start a rectangle selection at a widget position"""
+        self.rubber_band_origin = QPoint(pos)
+        self.rubber_band_rect = QRect(pos, pos)
+        self.rubber_band_additive = additive
+    
+    def update_rubber_band(self, pos):
+        """Stretch the selection rectangle to a widget position"""
+        old_rect = self.rubber_band_rect
+        self.rubber_band_rect = QRect(self.rubber_band_origin, pos).normalized()
+        self.update(old_rect.united(self.rubber_band_rect).adjusted(-2, -2, 2, 2))
+    
+    def finish_rubber_band(self):
+        """Select every shape lying fully inside the selection rectangle"""
+        rect = self.rubber_band_rect
+        additive = self.rubber_band_additive
+        self.cancel_rubber_band()
+        
+        # A click without dragging just clears the selection
+        if rect.width() < 3 and rect.height() < 3:
+            if not additive:
+                self.set_selection([])
+                self.emit_selection()
+                print("👆 Clicked on empty area")
+            return
+        
+        # Range query on the spatial index, then exact containment of the bounds
+        x1 = (rect.left() - self.offset_x) / self.scale
+        y1 = (rect.top() - self.offset_y) / self.scale
+        x2 = (rect.right() + 1 - self.offset_x) / self.scale
+        y2 = (rect.bottom() + 1 - self.offset_y) / self.scale
+        self.ensure_spatial_index()
+        found = []
+        for shape in self.spatial_index.query(x1, y1, x2, y2):
+            bx1, by1, bx2, by2 = shape.get_bounds()
+            if x1 <= bx1 and y1 <= by1 and bx2 <= x2 and by2 <= y2:
+                found.append(shape)
+        found.sort(key=lambda shape: self.shape_order[id(shape)])
+        
+        if additive:
+            found = self.selected_shapes + [shape for shape in found if not shape.selected]
+        self.set_selection(found)
+        self.emit_selection()
+        print(f"⬚ Selected {len(found)} shape(s)")
+        self.update()
+    
+    def cancel_rubber_band(self):
+        """Drop the selection rectangle"""
+        if self.rubber_band_rect is not None:
+            self.update(self.rubber_band_rect.adjusted(-2, -2, 2, 2))
+        self.rubber_band_origin = None
+        self.rubber_band_rect = None
+        self.rubber_band_additive = False
+    
+    def draw_rubber_band(self, painter):
+        """Draw the selection rectangle"""
+        if self.rubber_band_rect is not None:
+            painter.setPen(self.style_cache.rubber_band_pen)
+            painter.setBrush(self.style_cache.rubber_band_brush)
+            painter.drawRect(self.rubber_band_rect)
+    
+    def is_editing(self):
+        """Check whether a shape is being drawn, moved, resized or copied"""
+        return bool(
+            self.dragging or self.moving or self.resizing or self.drawing or self.drag_copy
+            or self.rubber_band_origin is not None or self.polygon_points or self.circle_center or getattr(self, 'ellipse_center', None)
+        )
+    
+    def update_hover(self, pos):
+        """Track the shape and handle under the cursor"""
+        if not self.hover_enabled or not self.has_image() or self.is_editing():
+            self.set_hover(None, None)
+            return
+        
+        # Handles of the selected shape take priority over shapes
+        handle = self.get_resize_handle_at_pos(pos, self.selected_shape)
+        shape = None
+        if handle is None:
+            image_x = (pos.x() - self.offset_x) / self.scale
+            image_y = (pos.y() - self.offset_y) / self.scale
+            shape = self.hover_hit_test(image_x, image_y)
+            if shape and shape.selected:
+                shape = None  # Already highlighted
+        self.set_hover(shape, handle)
+    
+    def hover_hit_test(self, image_x, image_y):
+        """Get the topmost shape at an image point from the cached cell candidates"""
+        self.ensure_spatial_index()
+        cell = self.spatial_index.cell_at(image_x, image_y)
+        
+        # Re-query only when the cursor enters another cell or shapes changed
+        if cell != self.hover_cell or self.hover_version != self.layer_version:
+            candidates = self.spatial_index.query_cell(cell)
+            candidates.sort(key=lambda shape: self.shape_order[id(shape)], reverse=True)
+            self.hover_cell = cell
+            self.hover_candidates = candidates
+            self.hover_version = self.layer_version
+        
+        for shape in self.hover_candidates:
+            if shape.contains_point(image_x, image_y):
+                return shape
+        return None
+    
+    def set_hover(self, shape, handle):
+        """Change the hovered shape and handle, repainting only the old and new highlight"""
+        if shape is self.hovered_shape and handle == self.hovered_handle:
+            return
+        old_rect = self.hover_widget_rect()
+        self.hovered_shape = shape
+        self.hovered_handle = handle
+        self.update(old_rect.united(self.hover_widget_rect()))
+    
+    def get_handle_position(self, shape, handle):
+        """Get the pixel position of a shape's resize handle, or None"""
+        if isinstance(handle, int):
+            pixel_points = shape.to_pixel_points()
+            return pixel_points[handle] if 0 <= handle < len(pixel_points) else None
+        return shape.get_resize_handles().get(handle)
+    
+    def hover_widget_rect(self):
+        """Get the widget area of the current hover highlight"""
+        rect = QRect()
+        if self.hovered_shape:
+            rect = self.shape_widget_rect(self.hovered_shape)
+        if self.hovered_handle is not None and self.selected_shape:
+            position = self.get_handle_position(self.selected_shape, self.hovered_handle)
+            if position:
+                wx = int(position[0] * self.scale + self.offset_x)
+                wy = int(position[1] * self.scale + self.offset_y)
+                size = self.handle_size
+                rect = rect.united(QRect(wx - size, wy - size, 2 * size, 2 * size))
+        return rect
+    
+    def draw_hover(self, painter):
+        """Draw the hovered shape outline and the hovered handle"""
+        if self.hovered_shape and not self.hovered_shape.selected:
+            painter.setPen(self.style_cache.hover_pen)
+            painter.setBrush(self.style_cache.hover_brush)
+            self.draw_shape(painter, self.hovered_shape, batched=True)
+        
+        if self.hovered_handle is not None and self.selected_shape:
+            position = self.get_handle_position(self.selected_shape, self.hovered_handle)
+            if position:
+                wx = int(position[0] * self.scale + self.offset_x)
+                wy = int(position[1] * self.scale + self.offset_y)
+                half = self.handle_size // 2 + 2
+                painter.setPen(self.style_cache.handle_pen)
+                painter.setBrush(self.style_cache.hover_handle_brush)
+                painter.drawRect(wx - half, wy - half, 2 * half, 2 * half)
+    
+    # ===== PARTIAL REPAINT HELPERS =====
+    def shape_widget_rect(self, shape):
+        """Get the widget area covered by a shape, its handles and its label"""
+        x1, y1, x2, y2 = shape.get_bounds()
+        left = int(x1 * self.scale + self.offset_x)
+        top = int(y1 * self.scale + self.offset_y)
+        right = int(x2 * self.scale + self.offset_x)
+        bottom = int(y2 * self.scale + self.offset_y)
+        
+        # Leave room for the selection pen and resize handles
+        margin = self.handle_size + 3
+        rect = QRect(QPoint(left, top), QPoint(right, bottom)).adjusted(-margin, -margin, margin, margin)
+        
+        # Class label sits above the shape and may extend past its right edge
+        label_width, label_height = self.label_extent(shape)
+        return rect.adjusted(0, -label_height, label_width, 0)
+    
+    def shapes_widget_rect(self, shapes):
+        """Get the widget area covered by several shapes"""
+        rect = QRect()
+        for shape in shapes:
+            rect = rect.united(self.shape_widget_rect(shape))
+        return rect
+    
+    def shapes_bounds(self, shapes):
+        """Get the pixel rect (x1, y1, x2, y2) enclosing several shapes"""
+        bounds = [shape.get_bounds() for shape in shapes]
+        return (
+            min(b[0] for b in bounds), min(b[1] for b in bounds),
+            max(b[2] for b in bounds), max(b[3] for b in bounds)
+        )
+    
+    def label_extent(self, shape):
+        """Get the (width, height) of a shape's class label background"""
+        if not self.class_manager or not getattr(shape, 'class_id', None):
+            return 0, 0
+        cls = self.class_manager.get_class(shape.class_id)
+        if not cls:
+            return 0, 0
+        label = self.style_cache.get_label(cls.name)
+        return label.background_width, label.background_height
+    
+    def preview_widget_rect(self, cx, cy, rx, ry):
+        """Get the widget area covered by a circle or ellipse preview"""
+        wx = int(cx * self.scale + self.offset_x)
+        wy = int(cy * self.scale + self.offset_y)
+        wrx = int(rx * self.scale)
+        wry = int(ry * self.scale)
+        margin = self.handle_size + 3
+        return QRect(wx - wrx - margin, wy - wry - margin, 2 * (wrx + margin), 2 * (wry + margin))
+    
+    def update_shape_area(self, old_rect, shape):
+        """Repaint only the union of a shape's previous and current area"""
+        self.update(old_rect.united(self.shape_widget_rect(shape)))
+    
     # ===== UNDO/REDO METHODS =====
-    def save_state(self):
-        """Save current state for undo"""
-        # Create a copy of current shapes
-        state = []
-        for shape in self.shapes:
-            if hasattr(shape, 'copy'):
-                state.append(shape.copy())
-        
-        self.undo_stack.append(state)
-        if len(self.undo_stack) > self.max_stack_size:
-            self.undo_stack.pop(0)
-        self.redo_stack.clear()  # Clear redo stack on new action
-        print(f"💾 State saved (undo stack: {len(self.undo_stack)})")
-
+    def push_command(self, command, coalesce=False):
+        """Record an edit that was just made, for undo; coalesce merges quick repeats into one step"""
+        self.history.push(command, coalesce)
+        self.history_changed.emit(self.histories.enforce_budget())
+        print(f"💾 {type(command).__name__} saved (undo stack: {self.history.undo_count})")
+        
+    def begin_undo_group(self):
+        """Record the following edits as one undo step, until end_undo_group"""
+        self.history.begin_group()
+        
+    def end_undo_group(self):
+        """Close an undo group started with begin_undo_group"""
+        self.history.end_group()
+        self.history_changed.emit(self.histories.enforce_budget())
+        
+    def set_history_engine(self, history_class):
+        """Switch undo engine, e.g. to VersionHistory, starting fresh histories for all images"""
+        stashed = self.histories.stashed
+        self.histories = ImageHistories(self.histories.budget_bytes, self.max_stack_size, history_class)
+        self.histories.stashed = stashed
+        self.history = self.histories.visit(self.image_path, self.shapes)
+        self.history_changed.emit(self.histories.size_bytes)
+        print(f"🕘 Using {history_class.__name__} for undo")
+        
+    def set_history_budget(self, budget_bytes):
+        """Set the memory budget shared by the undo histories of all images"""
+        self.histories.budget_bytes = budget_bytes
+        self.history_changed.emit(self.histories.enforce_budget())
+        
+    def set_selection_class(self, class_id):
+        """Give all selected shapes another class as one undo step"""
+        shapes = [shape for shape in self.selected_shapes if shape.class_id != class_id]
+        if not shapes:
+            return False
+        command = ChangeClass(shapes, class_id)
+        command.apply(self)
+        self.push_command(command)
+        self.update()
+        print(f"🏷️ Changed class of {len(shapes)} shape(s)")
+        return True
+        
     def undo(self):
         """Undo last action"""
-        if not self.undo_stack:
+        if self.history.undo(self) is None:
             print("⚠️ Nothing to undo")
             return False
         
-        # Save current state to redo stack
-        current_state = []
-        for shape in self.shapes:
-            if hasattr(shape, 'copy'):
-                current_state.append(shape.copy())
-        self.redo_stack.append(current_state)
-        
-        # Restore previous state
-        self.shapes = self.undo_stack.pop()
-        self.selected_shape = None
+        self.set_selection([])
         self.shape_selected.emit("none")
         self.update()
-        print(f"↩ Undo completed (undo: {len(self.undo_stack)}, redo: {len(self.redo_stack)})")
+        print(f"↩ Undo completed (undo: {self.history.undo_count}, redo: {self.history.redo_count})")
         return True
 
     def redo(self):
         """Redo last undone action"""
-        if not self.redo_stack:
+        if self.history.redo(self) is None:
             print("⚠️ Nothing to redo")
             return False
         
-        # Save current state to undo stack
-        current_state = []
-        for shape in self.shapes:
-            if hasattr(shape, 'copy'):
-                current_state.append(shape.copy())
-        self.undo_stack.append(current_state)
-        
-        # Restore next state
-        self.shapes = self.redo_stack.pop()
-        self.selected_shape = None
+        self.set_selection([])
         self.shape_selected.emit("none")
         self.update()
-        print(f"↪ Redo completed (undo: {len(self.undo_stack)}, redo: {len(self.redo_stack)})")
-        return True
\ No newline at end of file
+        print(f"↪ Redo completed (undo: {self.history.undo_count}, redo: {self.history.redo_count})")
+        return True
+
+# Drawing functions of the built-in shape types
+set_shape_drawer('box', AnnotationCanvas.draw_single_box)
+set_shape_drawer('circle', AnnotationCanvas.draw_circle)
+set_shape_drawer('ellipse', AnnotationCanvas.draw_ellipse)
+set_shape_drawer('polygon', AnnotationCanvas.draw_polygon)
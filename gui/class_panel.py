@@ -17,6 +17,7 @@ class ClassPanel(QWidget):
     class_selected = pyqtSignal(str)
     class_added = pyqtSignal()
     class_removed = pyqtSignal()
+    class_edited = pyqtSignal(str)
     
     def __init__(self, class_manager: ClassManager):
         super().__init__()
@@ -259,6 +260,7 @@ class ClassPanel(QWidget):
                     cls.name = name.strip()
                     cls.color = color.name()
                     self.refresh_list()
+                    self.class_edited.emit(class_id)
     
     def delete_class(self):
         """Delete selected class"""
@@ -0,0 +1,266 @@
+# gui/image_renderer.py
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QRect, QRectF, QSize
+from PyQt5.QtGui import QPainter, QPixmap, QImageReader, QImageIOHandler
+
+# Images above either limit are drawn from a tile pyramid instead of one QPixmap
+TILED_IMAGE_PIXELS = 64 * 1024 * 1024
+TILED_IMAGE_SIDE = 16384
+
+# Tile pyramid parameters
+TILE_SIZE = 256
+MAX_CACHED_TILES = 512
+MAX_DECODED_BYTES = 256 * 1024 * 1024  # Whole decoded levels, for formats without clip decoding
+
+
+class PixmapImageRenderer:
+    """Draws a whole-image QPixmap through the canvas view transform"""
+
+    def __init__(self, pixmap, max_cached_scales=3):
+        self.pixmap = pixmap
+        self.width = pixmap.width()
+        self.height = pixmap.height()
+
+        # Smooth downscaled copies, keyed by zoom level (LRU)
+        self.max_cached_scales = max_cached_scales
+        self._scaled_cache = OrderedDict()
+
+        # Cache statistics
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def draw(self, painter, scale, offset_x, offset_y, smooth=True):
+        """Draw the image at the given scale and offset
+
+        While the user is interacting (smooth=False) the painter samples the
+        source pixmap directly with nearest-neighbour filtering, which only
+        touches the visible pixels. Once idle, zoomed-out views use a cached
+        smooth-scaled pixmap and zoomed-in views use bilinear filtering.
+        """
+        if smooth and scale < 1.0:
+            scaled = self.get_scaled_pixmap(scale)
+            painter.drawPixmap(int(offset_x), int(offset_y), scaled)
+            return
+
+        painter.save()
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, smooth)
+        target = QRectF(offset_x, offset_y, self.width * scale, self.height * scale)
+        painter.drawPixmap(target, self.pixmap, QRectF(self.pixmap.rect()))
+        painter.restore()
+
+    def get_scaled_pixmap(self, scale):
+        """Get a smooth-scaled copy of the image for a zoom level"""
+        key = round(scale, 4)
+        scaled = self._scaled_cache.get(key)
+        if scaled is not None:
+            self._scaled_cache.move_to_end(key)
+            self.cache_hits += 1
+            return scaled
+
+        self.cache_misses += 1
+        scaled = self.pixmap.scaled(
+            max(1, int(self.width * scale)), max(1, int(self.height * scale)),
+            Qt.KeepAspectRatio,
+            Qt.SmoothTransformation
+        )
+        self._scaled_cache[key] = scaled
+        while len(self._scaled_cache) > self.max_cached_scales:
+            self._scaled_cache.popitem(last=False)
+        return scaled
+
+    def clear_cache(self):
+        """Drop all cached scaled pixmaps"""
+        self._scaled_cache.clear()
+
+
+class TiledImageRenderer:
+    """Draws a large image from a lazily decoded multi-resolution tile pyramid
+
+    Level 0 is the full-resolution image and every further level halves it.
+    Only tiles intersecting the viewport at the level matching the current
+    scale are decoded and uploaded; the rest are evicted by LRU. Formats
+    that can decode a clipped, scaled region decode each tile on its own.
+    Other formats decode the whole image once to build the pyramid; those
+    whole levels are kept in an LRU bounded by max_decoded_bytes.
+    """
+
+    def __init__(self, image_path, tile_size=TILE_SIZE, max_tiles=MAX_CACHED_TILES,
+                 max_decoded_bytes=MAX_DECODED_BYTES):
+        self.image_path = image_path
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.max_decoded_bytes = max_decoded_bytes
+
+        reader = QImageReader(image_path)
+        size = reader.size()
+        self.width = size.width()
+        self.height = size.height()
+
+        # Formats that can decode a sub-rectangle do not need the full image
+        self.supports_clip = reader.supportsOption(QImageIOHandler.ClipRect)
+        self.supports_scaled = reader.supportsOption(QImageIOHandler.ScaledSize)
+
+        # Number of levels until the whole image fits in a single tile
+        self.max_level = 0
+        while max(self.width, self.height) >> self.max_level > tile_size:
+            self.max_level += 1
+
+        self._levels = OrderedDict()  # level -> whole decoded QImage, only without clip decoding (LRU)
+        self._tiles = OrderedDict()  # (level, tx, ty) -> QPixmap (LRU)
+
+        # Cache statistics
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def is_valid(self):
+        """Check whether the image header could be read"""
+        return self.width > 0 and self.height > 0
+
+    def level_for_scale(self, scale):
+        """Pick the coarsest level that still has at least one pixel per screen pixel"""
+        if scale >= 1.0:
+            return 0
+        level = int(math.floor(math.log2(1.0 / scale)))
+        return max(0, min(self.max_level, level))
+
+    def draw(self, painter, scale, offset_x, offset_y, smooth=True):
+        """Draw the visible tiles at the given scale and offset"""
+        level = self.level_for_scale(scale)
+        factor = 1 << level
+        level_width = max(1, self.width // factor)
+        level_height = max(1, self.height // factor)
+
+        # Visible part of the image in level coordinates
+        viewport = painter.viewport()
+        left = max(0.0, (viewport.left() - offset_x) / scale / factor)
+        top = max(0.0, (viewport.top() - offset_y) / scale / factor)
+        right = min(level_width, (viewport.right() + 1 - offset_x) / scale / factor)
+        bottom = min(level_height, (viewport.bottom() + 1 - offset_y) / scale / factor)
+        if right <= left or bottom <= top:
+            return
+
+        tile = self.tile_size
+        first_tx, last_tx = int(left // tile), int(math.ceil(right / tile))
+        first_ty, last_ty = int(top // tile), int(math.ceil(bottom / tile))
+
+        # Never evict tiles needed for this frame
+        visible_count = (last_tx - first_tx) * (last_ty - first_ty)
+        capacity = max(self.max_tiles, visible_count * 2)
+
+        # Each level pixel covers factor * scale screen pixels
+        step = factor * scale
+        painter.save()
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, smooth)
+        for ty in range(first_ty, last_ty):
+            for tx in range(first_tx, last_tx):
+                pixmap = self.get_tile(level, tx, ty, capacity)
+                if pixmap is None:
+                    continue
+                target = QRectF(
+                    offset_x + tx * tile * step,
+                    offset_y + ty * tile * step,
+                    pixmap.width() * step,
+                    pixmap.height() * step
+                )
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+        painter.restore()
+
+    def get_tile(self, level, tx, ty, capacity=None):
+        """Get an uploaded tile, decoding it on a cache miss"""
+        key = (level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            self.cache_hits += 1
+            return pixmap
+
+        self.cache_misses += 1
+        image = self.decode_tile(level, tx, ty)
+        if image is None or image.isNull():
+            return None
+        pixmap = QPixmap.fromImage(image)
+        self._tiles[key] = pixmap
+
+        capacity = capacity or self.max_tiles
+        while len(self._tiles) > capacity:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def decode_tile(self, level, tx, ty):
+        """Decode the pixels of a single tile as a QImage"""
+        tile = self.tile_size
+        factor = 1 << level
+        level_rect = QRect(0, 0, max(1, self.width // factor), max(1, self.height // factor))
+        rect = QRect(tx * tile, ty * tile, tile, tile).intersected(level_rect)
+        if rect.isEmpty():
+            return None
+
+        if self.supports_clip and (level == 0 or self.supports_scaled):
+            # Read just the tile's source pixels, letting the decoder downsample them
+            reader = QImageReader(self.image_path)
+            source_rect = QRect(rect.x() * factor, rect.y() * factor, rect.width() * factor, rect.height() * factor)
+            reader.setClipRect(source_rect.intersected(QRect(0, 0, self.width, self.height)))
+            if level:
+                reader.setScaledSize(rect.size())
+            return reader.read()
+
+        return self.get_level_image(level).copy(rect)
+
+    def get_level_image(self, level):
+        """Get a whole decoded pyramid level (only for formats without clip decoding)"""
+        image = self._levels.get(level)
+        if image is not None:
+            self._levels.move_to_end(level)
+            return image
+
+        source = self._levels.get(0)
+        if source is None:
+            source = QImageReader(self.image_path).read()
+        if level == 0:
+            self.cache_level(0, source)
+            return source
+
+        # Build every coarser level from one decode; the source itself is not kept
+        wanted = None
+        image = source
+        for current in range(1, self.max_level + 1):
+            factor = 1 << current
+            size = QSize(max(1, self.width // factor), max(1, self.height // factor))
+            image = image.scaled(size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            if current == level:
+                wanted = image
+            else:
+                self.cache_level(current, image)
+        self.cache_level(level, wanted)  # Cached last, so evicted last
+        return wanted
+
+    def cache_level(self, level, image):
+        """Keep a decoded level, evicting the least recently used ones past the byte limit"""
+        self._levels[level] = image
+        self._levels.move_to_end(level)
+        total = sum(cached.sizeInBytes() for cached in self._levels.values())
+        while total > self.max_decoded_bytes and len(self._levels) > 1:
+            _, evicted = self._levels.popitem(last=False)
+            total -= evicted.sizeInBytes()
+
+    def clear_cache(self):
+        """Drop all uploaded tiles and decoded levels"""
+        self._tiles.clear()
+        self._levels.clear()
+
+
+def create_image_renderer(image_path):
+    """Create the renderer best suited to an image file, or None if it cannot be read"""
+    size = QImageReader(image_path).size()
+    width, height = size.width(), size.height()
+
+    if width * height > TILED_IMAGE_PIXELS or max(width, height) > TILED_IMAGE_SIDE:
+        renderer = TiledImageRenderer(image_path)
+        return renderer if renderer.is_valid() else None
+
+    pixmap = QPixmap(image_path)
+    if pixmap.isNull():
+        return None
+    return PixmapImageRenderer(pixmap)
@@ -13,6 +13,8 @@ import os
 from gui.canvas import AnnotationCanvas
 from gui.class_panel import ClassPanel
 from core.class_manager import ClassManager
+from core.history import History
+from core.version_history import VersionHistory
 
 class ToolButton(QPushButton):
     """Custom tool button for vertical toolbar with icon only"""
@@ -86,6 +88,7 @@ class ShortcutBar(QFrame):
         shortcuts = [
             ("A/D", "Prev/Next Image"),
             ("Del", "Delete Box"),
+            ("Arrows", "Nudge"),
             ("Ctrl+C", "Copy"),
             ("Ctrl+V", "Paste"),
             ("Ctrl+Z", "Undo"),
@@ -283,6 +286,11 @@ class MainWindow(QMainWindow):
         redo_action.triggered.connect(self.redo)
         edit_menu.addAction(redo_action)
         
+        self.versions_action = QAction('Keep Full &Versions', self)
+        self.versions_action.setCheckable(True)
+        self.versions_action.triggered.connect(self.toggle_version_history)
+        edit_menu.addAction(self.versions_action)
+        
         edit_menu.addSeparator()
         
         copy_action = QAction('&Copy', self)
@@ -300,6 +308,11 @@ class MainWindow(QMainWindow):
         delete_action.triggered.connect(self.delete_selected)
         edit_menu.addAction(delete_action)
         
+        assign_class_action = QAction('Assign Current &Class', self)
+        assign_class_action.setShortcut('Ctrl+L')
+        assign_class_action.triggered.connect(self.assign_current_class)
+        edit_menu.addAction(assign_class_action)
+        
         # ===== VIEW MENU =====
         view_menu = menubar.addMenu('&View')
         
@@ -318,6 +331,20 @@ class MainWindow(QMainWindow):
         fit_action.triggered.connect(self.fit_to_window)
         view_menu.addAction(fit_action)
         
+        view_menu.addSeparator()
+        
+        self.perf_hud_action = QAction('Performance &HUD', self)
+        self.perf_hud_action.setShortcut('F3')
+        self.perf_hud_action.setCheckable(True)
+        self.perf_hud_action.triggered.connect(self.toggle_perf_hud)
+        view_menu.addAction(self.perf_hud_action)
+        
+        self.hover_action = QAction('Hover &Highlight', self)
+        self.hover_action.setCheckable(True)
+        self.hover_action.setChecked(True)
+        self.hover_action.triggered.connect(self.toggle_hover_highlight)
+        view_menu.addAction(self.hover_action)
+        
         # ===== MODE MENU =====
         mode_menu = menubar.addMenu('&Mode')
         
@@ -369,6 +396,12 @@ class MainWindow(QMainWindow):
         self.counter_label.setStyleSheet("color: #ffffff;")
         self.status_bar.addPermanentWidget(self.counter_label)
         
+        # Memory held by the undo histories
+        self.history_label = QLabel("History: 0.0 KB")
+        self.history_label.setStyleSheet("color: #ffffff;")
+        self.history_label.setToolTip("Memory held by the undo histories, and by the shapes of other visited images")
+        self.status_bar.addPermanentWidget(self.history_label)
+        
         self.status_bar.showMessage("Ready")
         
     def setup_central_widget(self):
@@ -399,6 +432,7 @@ class MainWindow(QMainWindow):
         self.canvas.set_class_manager(self.class_manager)
         self.canvas.position_changed.connect(self.update_position)
         self.canvas.shape_selected.connect(self.on_canvas_shape_selected)
+        self.canvas.history_changed.connect(self.update_history_size)
         content_layout.addWidget(self.canvas, 7)  # 70% stretch factor
         
         # ===== RIGHT PANEL - CLASSES + FILE BROWSER (20%) =====
@@ -578,6 +612,8 @@ class MainWindow(QMainWindow):
         layout.addWidget(classes_label)
         
         self.class_panel = ClassPanel(self.class_manager)
+        self.class_panel.class_edited.connect(self.on_classes_changed)
+        self.class_panel.class_removed.connect(self.on_classes_changed)
         # Make sure ClassPanel has proper styling (we'll update it separately)
         layout.addWidget(self.class_panel)
         
@@ -665,6 +701,11 @@ class MainWindow(QMainWindow):
             shape_name = shape_type.capitalize() if shape_type != "none" else "No shape"
             self.status_bar.showMessage(f"{shape_name} selected - 'None' mode activated", 2000)
     
+    def on_classes_changed(self, *args):
+        """Redraw annotations after a class is edited or removed"""
+        if hasattr(self, 'canvas'):
+            self.canvas.on_classes_changed()
+    
     def switch_mode(self, mode):
         """Switch between YOLO and U-Net modes"""
         if mode == 'yolo':
@@ -766,6 +807,20 @@ class MainWindow(QMainWindow):
         """Update cursor position in status bar"""
         self.position_label.setText(f"X: {x}, Y: {y}")
     
+    def update_history_size(self, size_bytes):
+        """Show the memory held by the undo histories, and by other images' shapes, in the status bar"""
+        text = f"History: {self.format_size(size_bytes)}"
+        stashed_bytes = self.canvas.histories.stashed_bytes
+        if stashed_bytes:
+            text += f" | Other images: {self.format_size(stashed_bytes)}"
+        self.history_label.setText(text)
+        
+    def format_size(self, size_bytes):
+        """Format a byte count as KB with one decimal, or MB past a megabyte"""
+        if size_bytes < 1024 * 1024:
+            return f"{size_bytes / 1024:.1f} KB"
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    
     # ===== DELEGATION METHODS =====
     def zoom_in(self):
         if hasattr(self, 'canvas'):
@@ -779,12 +834,20 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'canvas'):
             self.canvas.fit_to_window()
     
+    def toggle_perf_hud(self, checked):
+        if hasattr(self, 'canvas'):
+            self.canvas.set_perf_hud_visible(checked)
+    
+    def toggle_hover_highlight(self, checked):
+        if hasattr(self, 'canvas'):
+            self.canvas.set_hover_enabled(checked)
+    
     def copy_selected(self):
         if hasattr(self, 'canvas'):
             self.canvas.copy_selected()
     
     def paste_shape(self):
-        if hasattr(self, 'canvas') and hasattr(self.canvas, 'pixmap') and self.canvas.pixmap:
+        if hasattr(self, 'canvas') and self.canvas.has_image():
             center = self.canvas.rect().center()
             self.canvas.start_paste(center)
     
@@ -792,6 +855,16 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'canvas'):
             self.canvas.delete_selected()
     
+    def assign_current_class(self):
+        if hasattr(self, 'canvas'):
+            current_class = self.class_manager.get_current_class()
+            if current_class and self.canvas.set_selection_class(current_class.id):
+                self.status_bar.showMessage(f"Class set to {current_class.name}", 1000)
+    
+    def toggle_version_history(self, checked):
+        if hasattr(self, 'canvas'):
+            self.canvas.set_history_engine(VersionHistory if checked else History)
+    
     def undo(self):
         if hasattr(self, 'canvas'):
             self.canvas.undo()  # You'll need to implement undo in canvas
@@ -0,0 +1,119 @@
+# gui/perf_hud.py
+import time
+from collections import deque
+
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QPen, QFont, QFontMetrics
+
+
+class PerfStats:
+    """Rolling paint timings and cache counters for the canvas HUD"""
+
+    def __init__(self, window=60):
+        self.frame_times = deque(maxlen=window)  # Paint durations (ms)
+        self.frame_stamps = deque(maxlen=1000)  # Paint start times (s)
+        self._frame_start = None
+
+        # Last time the image and inactive shapes were drawn, into the layer or directly
+        self.image_ms = 0.0
+        self.layer_shapes_ms = 0.0
+
+        # Breakdown of the last frame
+        self.blit_ms = 0.0
+        self.active_ms = 0.0
+
+        # Static layer cache counters
+        self.layer_hits = 0
+        self.layer_misses = 0
+
+    def begin_frame(self):
+        """Mark the start of a paint event"""
+        self._frame_start = time.perf_counter()
+        self.frame_stamps.append(self._frame_start)
+        self.blit_ms = 0.0
+        self.active_ms = 0.0
+
+    def end_frame(self):
+        """Mark the end of a paint event"""
+        if self._frame_start is not None:
+            self.frame_times.append((time.perf_counter() - self._frame_start) * 1000)
+            self._frame_start = None
+
+    def fps(self):
+        """Get the number of frames painted during the last second"""
+        now = time.perf_counter()
+        return sum(1 for stamp in self.frame_stamps if now - stamp <= 1.0)
+
+    def average_frame_ms(self):
+        """Get the mean paint duration over the rolling window"""
+        if not self.frame_times:
+            return 0.0
+        return sum(self.frame_times) / len(self.frame_times)
+
+    def reset(self):
+        """Clear all timings and counters"""
+        self.__init__(self.frame_times.maxlen)
+
+
+def hit_rate(hits, misses):
+    """Format a cache hit rate as a percentage"""
+    total = hits + misses
+    if total == 0:
+        return "n/a"
+    return f"{100 * hits / total:.0f}% ({hits}/{total})"
+
+
+class PerformanceHud:
+    """Overlay listing paint timings, shape counts and cache hit rates"""
+
+    def __init__(self):
+        self.visible = False
+        self.font = QFont("Consolas", 9)
+        self.font.setStyleHint(QFont.Monospace)
+        self.metrics = QFontMetrics(self.font)
+        self.margin = 10
+        self.padding = 6
+
+    def get_lines(self, canvas):
+        """Build the HUD text for the canvas state"""
+        stats = canvas.perf_stats
+        lines = [
+            f"Frame: {stats.average_frame_ms():6.2f} ms",
+            f"FPS:   {stats.fps():6d}",
+            f"Shapes drawn:  {canvas.shapes_drawn}",
+            f"Shapes culled: {canvas.shapes_culled}",
+            f"Image draw:    {stats.image_ms:6.2f} ms",
+            f"Layer shapes:  {stats.layer_shapes_ms:6.2f} ms",
+            f"Active shapes: {stats.active_ms:6.2f} ms",
+            f"Layer blit:    {stats.blit_ms:6.2f} ms",
+            f"Layer cache: {hit_rate(stats.layer_hits, stats.layer_misses)}",
+        ]
+        renderer = canvas.image_renderer
+        if renderer is not None:
+            lines.append(f"Pixmap cache: {hit_rate(renderer.cache_hits, renderer.cache_misses)}")
+        lines.append(f"Dropped moves: {canvas.dropped_move_events}")
+        return lines
+
+    def get_rect(self, widget_width, line_count=11):
+        """Get the widget area the HUD occupies"""
+        width = self.metrics.horizontalAdvance("M" * 30) + 2 * self.padding
+        height = self.metrics.height() * line_count + 2 * self.padding
+        return QRect(widget_width - width - self.margin, self.margin, width, height)
+
+    def draw(self, painter, canvas):
+        """Draw the HUD in the top-right corner of the canvas"""
+        lines = self.get_lines(canvas)
+        rect = self.get_rect(canvas.width(), len(lines))
+
+        painter.save()
+        painter.fillRect(rect, QColor(0, 0, 0, 170))
+        painter.setPen(QPen(QColor(120, 255, 120), 1))
+        painter.setFont(self.font)
+
+        line_height = self.metrics.height()
+        x = rect.left() + self.padding
+        y = rect.top() + self.padding + self.metrics.ascent()
+        for line in lines:
+            painter.drawText(x, y, line)
+            y += line_height
+        painter.restore()
@@ -0,0 +1,96 @@
+# gui/style_cache.py
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QPen, QBrush, QFont, QFontMetrics, QStaticText, QTransform
+
+DEFAULT_SHAPE_COLOR = QColor(0, 255, 0)  # Shapes without a known class
+SELECTED_COLOR = QColor(255, 255, 0)
+HOVER_COLOR = QColor(0, 255, 255)
+
+
+class ShapeStyle:
+    """Pen, brushes and label for drawing shapes of one class"""
+
+    def __init__(self, color, selected=False, label=None):
+        self.color = color
+        self.selected = selected
+        self.label = label  # Class name, or None when the class is unknown
+
+        if selected:
+            self.pen = QPen(SELECTED_COLOR, 3)  # Yellow, thicker
+            self.brush = QBrush(QColor(color.red(), color.green(), color.blue(), 80))
+        else:
+            self.pen = QPen(color, 2)
+            self.brush = QBrush(QColor(color.red(), color.green(), color.blue(), 50))
+
+        # Boxes keep the light fill even when selected
+        self.box_brush = QBrush(QColor(color.red(), color.green(), color.blue(), 50))
+
+
+class LabelGlyphs:
+    """Pre-laid-out class label text with its measured background size"""
+
+    def __init__(self, text, font):
+        self.text = text
+        self.static_text = QStaticText(text)
+        self.static_text.setTextFormat(Qt.PlainText)
+        self.static_text.prepare(QTransform(), font)
+
+        metrics = QFontMetrics(font)
+        self.ascent = metrics.ascent()
+        self.text_width = metrics.horizontalAdvance(text)
+        self.text_height = metrics.height()
+
+        # Background box drawn behind the text
+        self.background_width = self.text_width + 10
+        self.background_height = self.text_height + 5
+
+
+class StyleCache:
+    """Caches shape styles per class id and selection state"""
+
+    def __init__(self, class_manager=None):
+        self.class_manager = class_manager
+        self._styles = {}  # (class_id, selected) -> ShapeStyle
+        self._labels = {}  # (text, font key) -> LabelGlyphs
+
+        # Shared by every class
+        self.handle_pen = QPen(QColor(0, 0, 0), 1)
+        self.handle_brush = QBrush(QColor(255, 255, 255))
+        self.label_pen = QPen(Qt.white, 1)
+        self.label_font = QFont("Arial", 8)
+        self.label_background = QColor(0, 0, 0, 150)
+        self.hover_pen = QPen(HOVER_COLOR, 2, Qt.DashLine)
+        self.hover_brush = QBrush(QColor(HOVER_COLOR.red(), HOVER_COLOR.green(), HOVER_COLOR.blue(), 40))
+        self.hover_handle_brush = QBrush(HOVER_COLOR)
+        self.rubber_band_pen = QPen(QColor(255, 255, 255), 1, Qt.DashLine)
+        self.rubber_band_brush = QBrush(QColor(100, 180, 255, 40))
+
+    def get_style(self, class_id, selected=False):
+        """Get the style for a class id and selection state"""
+        key = (class_id, selected)
+        style = self._styles.get(key)
+        if style is None:
+            cls = None
+            if self.class_manager and class_id:
+                cls = self.class_manager.get_class(class_id)
+            if cls:
+                style = ShapeStyle(QColor(cls.color), selected, cls.name)
+            else:
+                style = ShapeStyle(DEFAULT_SHAPE_COLOR, selected)
+            self._styles[key] = style
+        return style
+
+    def get_label(self, text, font=None):
+        """Get the laid-out glyphs for a label, in the label font by default"""
+        font = font or self.label_font
+        key = (text, font.key())
+        label = self._labels.get(key)
+        if label is None:
+            label = LabelGlyphs(text, font)
+            self._labels[key] = label
+        return label
+
+    def clear(self):
+        """Drop all cached styles and labels, e.g. after classes are edited"""
+        self._styles.clear()
+        self._labels.clear()